@@ -0,0 +1,98 @@
+"""
+Loopback benchmark of the main loop wakeup cost
+
+Compares the old `getConnections` + `select.select` loop iteration against
+the selectors based registration used by `RoomManager.main`, with a single
+readable socket out of 10, 100 and 2000 registered connections.
+
+Usage: python benchmarks/mainloop_wakeup.py [iterations]
+"""
+import os
+import select
+import socket
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import ch  # noqa: E402  pylint: disable=wrong-import-position
+
+
+class FakeConn:
+    """Minimal Conn, only reads the single byte used to wake the loop"""
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.connected = True
+
+    @property
+    def pendingWrite(self) -> bool:
+        return False
+
+    def rfeed(self):
+        self.sock.recv(1)
+
+    def wfeed(self):
+        ...
+
+
+def bench_select(conns: dict[socket.socket, FakeConn], peer: socket.socket, iterations: int):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        peer.send(b"x")
+        # what the old main loop did every iteration
+        current = dict((x.sock, x) for x in conns.values())
+        wsocks = [sock for sock, x in current.items() if x.pendingWrite]
+        rd, _wr, _ = select.select(current, wsocks, [], None)
+        for sock in rd:
+            current[sock].rfeed()
+    return (time.perf_counter() - start) / iterations
+
+
+def bench_selector(mgr: ch.RoomManager, peer: socket.socket, iterations: int):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        peer.send(b"x")
+        mgr._dispatch(mgr._selector.select(None))
+    return (time.perf_counter() - start) / iterations
+
+
+def run(count: int, iterations: int):
+    pairs = [socket.socketpair() for _ in range(count)]
+    conns = {a: FakeConn(a) for a, _b in pairs}
+    # wake up on the last registered socket, worst case for select.select
+    peer = pairs[-1][1]
+
+    mgr = ch.RoomManager(pm=False)
+    for conn in conns.values():
+        mgr._register(conn)  # type: ignore
+
+    try:
+        old = "%8.2f us" % (bench_select(conns, peer, iterations) * 1e6)
+    except ValueError:
+        old = "  FD_SETSIZE"
+    new = "%8.2f us" % (bench_selector(mgr, peer, iterations) * 1e6)
+    print(f"{count:>5} conns | select.select {old} | {type(mgr._selector).__name__} {new}")
+
+    mgr._selector.close()
+    for a, b in pairs:
+        a.close()
+        b.close()
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    if resource is not None:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < 4200:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (min(4200, hard), hard))
+
+    for count in (10, 100, 2000):
+        run(count, iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Loopback benchmark of ch.shard.ThreadedShards
+
+A fake room server floods every room with user count updates, the time
+for the bot to process all of them is compared between 1 and K shard threads.
+Only a free-threaded (no-GIL) build of CPython is expected to speed up.
+
+Usage: python benchmarks/threaded_shards.py [rooms] [frames per room] [K]
+"""
+import os
+import socket
+import sys
+import sysconfig
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import ch  # noqa: E402  pylint: disable=wrong-import-position
+import ch.shard  # noqa: E402  pylint: disable=wrong-import-position
+
+
+class FakeServer:
+    """Accept rooms, log them in as anon and flood them with frames"""
+    def __init__(self, frames: int):
+        self.sock = socket.create_server(("127.0.0.1", 0), backlog=4096)
+        self.port = self.sock.getsockname()[1]
+        self.payload = b"n:1f\r\n\x00" * frames
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle, args=(client,), daemon=True).start()
+
+    def handle(self, client: socket.socket):
+        try:
+            client.recv(4096)  # bauth
+            client.sendall(b"ok:owner:1234567890:N:0:1.2.3.4.5:1.2.3.4:mod,0\r\n\x00"
+                           b"inited\r\n\x00" + self.payload)
+            while client.recv(4096):
+                pass
+        except OSError:
+            pass
+
+
+def run(shards: int, rooms: int, frames: int) -> float:
+    server = FakeServer(frames)
+    done = threading.Event()
+    lock = threading.Lock()
+    remaining = [rooms * frames]
+
+    class BenchRoom(ch.Room):
+        def _connect(self):
+            self._server = "127.0.0.1"
+            self._port = server.port
+            super()._connect()
+
+    class Bot(ch.RoomManager):
+        _Room = BenchRoom
+
+        def onInit(self):
+            self.count = 0
+            # pick up the leftovers of the last batch
+            self.setInterval(0.05, self.flush)
+
+        def onUserCountChange(self, room: ch.Room):
+            self.count += 1
+            if self.count == 256:
+                self.flush()
+
+        def flush(self):
+            if not self.count:
+                return
+            with lock:
+                remaining[0] -= self.count
+                if remaining[0] <= 0:
+                    done.set()
+            self.count = 0
+
+    bots = ch.shard.ThreadedShards(Bot, shards=shards, pm=False)
+
+    start = time.perf_counter()
+    for i in range(rooms):
+        bots.joinRoom(f"bench{i}")
+    thread = threading.Thread(target=bots.main, daemon=True)
+    thread.start()
+    done.wait()
+    elapsed = time.perf_counter() - start
+    bots.stop()
+    thread.join(5)
+    server.sock.close()
+    return elapsed
+
+
+def main():
+    rooms = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    frames = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    shards = int(sys.argv[3]) if len(sys.argv) > 3 else (os.cpu_count() or 4)
+
+    gil = "free-threaded" if sysconfig.get_config_var("Py_GIL_DISABLED") else "GIL"
+    print(f"{sys.version.split()[0]} ({gil}), {rooms} rooms, {frames} frames per room")
+    base = run(1, rooms, frames)
+    print(f"  1 shard  {base:7.3f}s {rooms * frames / base:10.0f} frames/s")
+    sharded = run(shards, rooms, frames)
+    print(f"{shards:>3} shards {sharded:7.3f}s {rooms * frames / sharded:10.0f} frames/s"
+          f"  x{base / sharded:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark of the Task scheduler
+
+Compares the old heapq queue (cancelled tasks left in the heap till popped)
+against the timer wheel of `ch.Scheduler`, with N live timers and rounds of
+cancel + reschedule churn, like the ping and reconnect timers of many rooms.
+
+Usage: python benchmarks/timer_wheel.py [timers] [churn rounds]
+"""
+import heapq
+import os
+import random
+import sys
+import threading
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import ch  # noqa: E402  pylint: disable=wrong-import-position
+
+
+class HeapTask:
+    """What ch.Task used to do, cancelled tasks stay in the heap till popped"""
+    _tasks_queue: list = []
+    _counter = 0
+    _lock = threading.RLock()
+
+    def __init__(self, mgr: ch.RoomManager, timeout: float, func, isInterval: bool, args, kw):
+        with HeapTask._lock:
+            HeapTask._counter += 1
+            self.counter = HeapTask._counter
+        self.mgr = mgr
+        self.target = time.time() + timeout
+        self.timeout = timeout
+        self.func = func
+        self.isInterval = isInterval
+        self.args = args
+        self.kw = kw
+        self.cancelled = False
+        self.queued = False
+        self.queue()
+
+    def cancel(self):
+        with HeapTask._lock:
+            self.cancelled = True
+
+    def queue(self):
+        with HeapTask._lock:
+            if not self.queued:
+                self.queued = True
+                heapq.heappush(HeapTask._tasks_queue, (self.target, self.counter, self))
+
+    @staticmethod
+    def _yield_tasks(now: float):
+        queue = HeapTask._tasks_queue
+        while queue and (queue[0][0] <= now or queue[0][2].cancelled):
+            _target, _counter, task = heapq.heappop(queue)
+            task.queued = False
+            yield task
+
+    @staticmethod
+    def get_next_tick_target():
+        with HeapTask._lock:
+            while HeapTask._tasks_queue:
+                target, _tid, task = HeapTask._tasks_queue[0]
+                if task.cancelled:
+                    heapq.heappop(HeapTask._tasks_queue)
+                    continue
+                return target
+
+    @staticmethod
+    def tick():
+        now = time.time()
+        tasks = []
+        current = threading.current_thread()
+        with HeapTask._lock:
+            for task in HeapTask._yield_tasks(now):
+                if not task.cancelled:
+                    tasks.append(task)
+        for task in tasks:
+            if task.mgr._loopThread not in (None, current):
+                task.mgr.callFromThread(task.func, *task.args, **task.kw)
+            else:
+                task.func(*task.args, **task.kw)
+        if target := HeapTask.get_next_tick_target():
+            return target - now
+
+
+def noop():
+    ...
+
+
+def run(name: str, mgr: ch.RoomManager, taskClass, tick, queued, timers: int, rounds: int):
+    def make(timeout: float):
+        return taskClass(mgr, timeout, noop, False, (), {})
+
+    rnd = random.Random(0)
+    timeouts = [rnd.uniform(30, 600) for _ in range(timers)]
+
+    start = time.perf_counter()
+    tasks = [make(timeout) for timeout in timeouts]
+    add = (time.perf_counter() - start) / timers
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for i in rnd.sample(range(timers), timers // 10):
+            tasks[i].cancel()
+            tasks[i] = make(timeouts[i])
+    churn = (time.perf_counter() - start) / (rounds * (timers // 10))
+
+    ticks = min(timeit.repeat(tick, number=1000, repeat=5)) / 1000
+
+    print(f"{name:>6} | add {add * 1e6:6.2f} us | cancel+add {churn * 1e6:6.2f} us"
+          f" | tick {ticks * 1e6:7.2f} us | queued {queued():>8} for {timers} live")
+
+    for task in tasks:
+        task.cancel()
+
+
+def main():
+    timers = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    mgr = ch.RoomManager(pm=False)
+    run("heapq", mgr, HeapTask, HeapTask.tick, lambda: len(HeapTask._tasks_queue),
+        timers, rounds)
+    run("wheel", mgr, ch.Task, mgr.scheduler.tick, mgr.scheduler.size, timers, rounds)
+
+
+if __name__ == "__main__":
+    main()
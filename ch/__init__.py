@@ -58,18 +58,28 @@ from __future__ import annotations
 from typing import Any, Generator, Protocol, Self, Callable, Optional
 import typing
 import enum
-
+import collections
+import concurrent.futures
+import itertools
+import json
+import logging
+import traceback
+import functools
+
+import os
 import socket
+import sys
 import threading
 import time
 import random
 import re
-import select
+import selectors
+import signal
 import urllib.request
 import urllib.parse
 import urllib.error
 import bisect
-import heapq
+import math
 import html as _html
 
 from .ch_weights import specials, tsweights  # pylint: disable=E0401
@@ -79,6 +89,9 @@ from .ch_weights import specials, tsweights  # pylint: disable=E0401
 # Debug stuff
 ################################################################
 debug = False
+# slow task/handler and main loop stall reports, see RoomManager.slowTaskWarning
+# and RoomManager.watchdogTimeout, the fields are also set as record attributes
+_log = logging.getLogger(__name__)
 
 
 ################################################################
@@ -94,6 +107,22 @@ class BigMessage_Mode(enum.Enum):
     Cut = 2
 
 
+class OversizedFrame_Mode(enum.Enum):
+    Drop = 1
+    Disconnect = 2
+
+
+class Send_Priority(enum.IntEnum):
+    Control = 0
+    Moderation = 1
+    Chat = 2
+
+
+class Backpressure_Mode(enum.Enum):
+    Drop = 1
+    Merge = 2
+
+
 class BanRecord(typing.NamedTuple):
     unid: str
     ip: str
@@ -102,6 +131,14 @@ class BanRecord(typing.NamedTuple):
     src: User
 
 
+class RunStats(typing.NamedTuple):
+    """Runtime of a task function or event handler, see RoomManager.getSlowestTasks"""
+    name: str
+    calls: int
+    totalTime: float
+    maxTime: float
+
+
 ################################################################
 # Tag server stuff
 ################################################################
@@ -173,6 +210,37 @@ def _strip_html(msg: str):
     return re.sub("<.*?>", "", msg)
 
 
+def _getAddr(host: str, port: int) -> tuple[tuple[Any, ...] | Exception, float]:
+    """
+    Blocking lookup of an IPv4 address to connect to, run by RoomManager._resolve
+
+    @return: address or the error, and the time it took
+    """
+    start = time.perf_counter()
+    try:
+        addr = socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_STREAM)[0][4]
+    except Exception as error:  # pylint: disable=broad-except
+        # not only OSError, eg: UnicodeError of an invalid name
+        return error, time.perf_counter() - start
+    return addr, time.perf_counter() - start
+
+
+def _funcName(func: Callable[..., Any]) -> str:
+    """Name of the function behind a task, the same for every bound method/partial of it"""
+    while isinstance(func, functools.partial):
+        func = func.func
+    name = getattr(func, "__qualname__", None) or type(func).__qualname__
+    return f"{getattr(func, '__module__', None)}.{name}"
+
+
+def _formatMessage(prefix: str, msg: str) -> str:
+    """Put the name/font tags in front of an escaped message chunk"""
+    msg = prefix + msg
+    if "\n" in msg:
+        msg = msg.replace("\n", "\r")
+    return msg
+
+
 def _parseNameColor(n: str):
     """This just returns its argument, should return the name color."""
     # probably is already the name
@@ -191,6 +259,130 @@ def _parseFont(f: str):
         return "", "", ""
 
 
+################################################################
+# Send queue
+################################################################
+# max buffers per sendmsg call
+try:
+    _IOV_MAX: int = min(os.sysconf("SC_IOV_MAX"), 1024)
+except (AttributeError, ValueError, OSError):
+    _IOV_MAX = 1024
+
+# priority of the sent commands, anything else is Send_Priority.Control
+_sendPriorities = {
+    "delmsg": Send_Priority.Moderation,
+    "delallmsg": Send_Priority.Moderation,
+    "block": Send_Priority.Moderation,
+    "unblock": Send_Priority.Moderation,
+    "removeblock": Send_Priority.Moderation,
+    "clearall": Send_Priority.Moderation,
+    "addmod": Send_Priority.Moderation,
+    "removemod": Send_Priority.Moderation,
+    "g_flag": Send_Priority.Moderation,
+    "bmsg:tl2r": Send_Priority.Chat,
+    "msg": Send_Priority.Chat,
+}
+
+
+class _SendQueue:
+    """
+    Queue of encoded commands of a conn, sent by priority
+
+    Flushed with one scatter-gather send per loop tick, sent commands are
+    dropped from the queue without moving the unsent bytes around
+    """
+    def __init__(self):
+        # the partially sent command has to go first, then by priority
+        self._queues: tuple[collections.deque[bytes | memoryview], ...] = tuple(
+            collections.deque() for _ in range(len(Send_Priority) + 1))
+        self.size = 0
+        """Bytes queued"""
+        self.watch: bytes | memoryview | None = None
+        """Queued command to look out for, set back to None once fully sent"""
+
+    def __bool__(self):
+        return self.size > 0
+
+    def append(self, data: bytes, priority: Send_Priority):
+        self._queues[priority + 1].append(data)
+        self.size += len(data)
+
+    def last(self, priority: Send_Priority) -> bytes | memoryview | None:
+        """Get the last queued command of a priority, if not partially sent"""
+        if queue := self._queues[priority + 1]:
+            return queue[-1]
+        return None
+
+    def replaceLast(self, priority: Send_Priority, data: bytes):
+        """Replace the last queued command of a priority, see `last`"""
+        queue = self._queues[priority + 1]
+        self.size += len(data) - len(queue[-1])
+        queue[-1] = data
+
+    def clear(self):
+        for queue in self._queues:
+            queue.clear()
+        self.size = 0
+        self.watch = None
+
+    def send(self, sock: socket.socket) -> int:
+        """
+        Send as much as possible with a single syscall
+
+        @param sock: the socket
+
+        @return: number of commands fully sent
+        """
+        segments = list(itertools.islice(itertools.chain(*self._queues), _IOV_MAX))
+        if len(segments) == 1:
+            size = sock.send(segments[0])
+        elif hasattr(sock, "sendmsg"):
+            size = sock.sendmsg(segments)
+        else:
+            # no sendmsg on windows
+            size = sock.send(b"".join(segments))
+        self.size -= size
+
+        done = 0
+        for queue in self._queues:
+            while size and queue:
+                head = queue[0]
+                if len(head) <= size:
+                    size -= len(head)
+                    queue.popleft()
+                    done += 1
+                    if head is self.watch:
+                        self.watch = None
+                else:
+                    queue.popleft()
+                    rest = memoryview(head)[size:]
+                    if head is self.watch:
+                        self.watch = rest
+                    self._queues[0].append(rest)
+                    return done
+        return done
+
+
+################################################################
+# Command dispatch
+################################################################
+_commands: dict[type, frozenset[bytes]] = dict()
+
+
+def _getCommands(cls: type) -> frozenset[bytes]:
+    """
+    Get the commands a Room or PM class has a `_rcmd_` handler for.
+
+    @param cls: the conn class
+
+    @return: the command names, as bytes to be matched against the raw frames
+    """
+    if (commands := _commands.get(cls)) is None:
+        commands = _commands[cls] = frozenset(
+            name[6:].encode() for name in dir(cls) if name.startswith("_rcmd_"))
+    return commands
+
+
 ################################################################
 # Anon id
 ################################################################
@@ -227,27 +419,33 @@ class User:
     """Class that represents a user."""
 
     _users: dict[str, Self] = dict()
+    # guard the creation, users are shared by the rooms of every loop thread
+    _lock = threading.Lock()
 
     def __new__(cls, name: str, **_kw: ...) -> Self:
         """Return existing User Object for given user name"""
         lname = name.lower()
-        if lname not in cls._users:
-            cls._users[lname] = super().__new__(cls)
-        return cls._users[lname]
+        if (user := cls._users.get(lname)) is None:
+            with cls._lock:
+                if (user := cls._users.get(lname)) is None:
+                    user = cls._users[lname] = super().__new__(cls)
+        return user
 
     ####
     # Init
     ####
     def __init__(self, name: str, **kw: ...):
-        self.name = name.lower()
-        self.sids: dict[Room, set[str]] = dict()
-        self.msgs: list[Message] = list()
-        self.nameColor = "000"
-        self.fontSize = "12"
-        self.fontFace = "0"
-        self.fontColor = "000"
-        self.mbg = False
-        self.mrec = False
+        # __new__ returns the existing User, which would otherwise be reset on every lookup
+        if "name" not in self.__dict__:
+            self.name = name.lower()
+            self.sids: dict[Room, set[str]] = dict()
+            self.msgs: list[Message] = list()
+            self.nameColor = "000"
+            self.fontSize = "12"
+            self.fontFace = "0"
+            self.fontColor = "000"
+            self.mbg = False
+            self.mrec = False
         for attr, val in kw.items():
             # Avoid overriding existing val with None
             if val is not None:
@@ -377,122 +575,441 @@ class Message:
     def uid(self): return self.puid  # other library use uid so we create an alias
 
 
-class Task:
+class Clock:
     """
-    Better Deterministic Task Manager using Heapq
+    Time source of a RoomManager, its scheduler and conns
+
+    The real clock, the main loop waits on the selector for the next task.
     """
-    _tasks_queue:  list[tuple[float, int, Task]] = []
-    _tasks_once: set[Task] = set()
-    _tasks: set[Task] = set()
-    # Task counter/id to serve as tie breaker
-    # if there are multiple conflicting time target
-    _counter: int = 0
+    def time(self) -> float:
+        return time.time()
 
-    # for getting size of task queue by keeping track of count of canceled task
-    _removed: int = 0
+    def monotonic(self) -> float:
+        return time.monotonic()
 
-    running_task: None | Task = None
+    def select(self, selector: selectors.BaseSelector,
+               timeout: float | None) -> list[tuple[selectors.SelectorKey, int]]:
+        """Wait for I/O for at most timeout seconds"""
+        return selector.select(timeout)
+
+
+class VirtualClock(Clock):
+    """
+    Simulated time, jumping straight to the next task when there is no I/O
 
+    A day of pings, reconnects and intervals runs in as long as the tasks take,
+    share one between managers to keep them in the same simulated time.
+    """
+    def __init__(self, start: Optional[float] = None, ioWait: float = 0):
+        """
+        @param start: time.time at the start of the simulation, default to now
+        @param ioWait: real seconds to wait for I/O before moving the time forward
+        """
+        self._epoch = time.time() if start is None else start
+        self._now = 0.0
+        self.ioWait = ioWait
+
+    def time(self) -> float:
+        return self._epoch + self._now
+
+    def monotonic(self) -> float:
+        return self._now
+
+    def advance(self, seconds: float):
+        """Move the time forward"""
+        self._now += max(seconds, 0)
+
+    def select(self, selector: selectors.BaseSelector,
+               timeout: float | None) -> list[tuple[selectors.SelectorKey, int]]:
+        wait = self.ioWait if timeout is None else min(self.ioWait, timeout)
+        if not (events := selector.select(wait)) and timeout is not None:
+            self.advance(timeout)
+        return events
+
+
+class _TimerWheel:
+    """
+    Hierarchical timer wheel holding the Task with a timeout, O(1) add and remove
+
+    Time is counted in 1/_TicksPerSecond seconds of Clock.monotonic.
+    Level 0 has a slot per tick for the next 256 ticks, each next level has
+    64 slots covering a whole turn of the level below. When the wheel reaches
+    the slot of a higher level, its tasks are cascaded down to the level matching
+    how far away they are. Tasks further than the last level wait in an overflow
+    till they get in range.
+    """
+    _TicksPerSecond = 256
+    # (slot bits, shift) of each level
+    _Levels = ((8, 0), (6, 8), (6, 14), (6, 20))
+    # level of a tick delta by its bit_length, the overflow past the last one
+    _LevelOf = (0,) * 9 + (1,) * 6 + (2,) * 6 + (3,) * 6
+
+    def __init__(self, now: float):
+        self._current = int(now * self._TicksPerSecond)
+        self._slots: list[list[dict[Task, None]]] = [
+            [dict() for _ in range(1 << bits)] for bits, _shift in self._Levels]
+        self._overflow: dict[Task, None] = {}
+        # per level, the overflow last
+        self._counts = [0] * (len(self._Levels) + 1)
+        # earliest tick, recomputed on demand once _nextDirty
+        self._next: int | None = None
+        self._nextDirty = False
+
+    def __len__(self):
+        return sum(self._counts)
+
+    def add(self, task: Task):
+        tick = math.ceil(task.target * self._TicksPerSecond)
+        if tick <= self._current:
+            tick = self._current + 1
+        task._tick = tick
+        self._place(task, tick)
+        if not self._nextDirty and (self._next is None or tick < self._next):
+            self._next = tick
+
+    def remove(self, task: Task):
+        if task._slot is not None:
+            level, slot = task._slot
+            del slot[task]
+            self._counts[level] -= 1
+            task._slot = None
+            if task._tick == self._next:
+                self._nextDirty = True
+
+    def _place(self, task: Task, tick: int):
+        length = (tick - self._current).bit_length()
+        if length < len(self._LevelOf):
+            level = self._LevelOf[length]
+            bits, shift = self._Levels[level]
+            slot = self._slots[level][(tick >> shift) & ((1 << bits) - 1)]
+        else:
+            level, slot = len(self._Levels), self._overflow
+        slot[task] = None
+        self._counts[level] += 1
+        task._slot = (level, slot)
+
+    def _cascade(self, tick: int):
+        """Move the tasks of the higher level slots starting at tick down"""
+        for level in range(1, len(self._Levels) + 1):
+            if level == len(self._Levels):
+                index, slot = 0, self._overflow
+            else:
+                bits, shift = self._Levels[level]
+                index = (tick >> shift) & ((1 << bits) - 1)
+                slot = self._slots[level][index]
+            if slot:
+                tasks = list(slot)
+                slot.clear()
+                self._counts[level] -= len(tasks)
+                for task in tasks:
+                    self._place(task, task._tick)
+            if index:
+                break
+
+    def advance(self, now: float) -> list[Task]:
+        """
+        Move the wheel to now
+
+        @return: the tasks that are due, removed from the wheel
+        """
+        target = int(now * self._TicksPerSecond)
+        due: list[Task] = []
+        while self._current < target:
+            # jump over the turns of the empty levels
+            step = 1
+            for level, (bits, shift) in enumerate(self._Levels):
+                if self._counts[level]:
+                    break
+                step = 1 << (bits + shift)
+            else:
+                if not self._overflow:
+                    self._current = target
+                    break
+            tick = (self._current // step + 1) * step
+            if tick > target:
+                self._current = target
+                break
+            self._current = tick
+            if not tick & 255:
+                self._cascade(tick)
+            slot = self._slots[0][tick & 255]
+            if slot:
+                for task in slot:
+                    task._slot = None
+                due.extend(slot)
+                self._counts[0] -= len(slot)
+                slot.clear()
+        if due:
+            self._nextDirty = True
+        return due
+
+    def nextTarget(self) -> float | None:
+        """monotonic time of the earliest task, None if empty"""
+        if self._nextDirty:
+            self._nextDirty = False
+            self._next = None
+            for level, (bits, shift) in enumerate(self._Levels):
+                if not self._counts[level]:
+                    continue
+                size = 1 << bits
+                base = self._current >> shift
+                for i in range(1, size + 1):
+                    if slot := self._slots[level][(base + i) & (size - 1)]:
+                        tick = min(task._tick for task in slot)
+                        if self._next is None or tick < self._next:
+                            self._next = tick
+                        break
+            if self._overflow:
+                tick = min(task._tick for task in self._overflow)
+                if self._next is None or tick < self._next:
+                    self._next = tick
+        return None if self._next is None else self._next / self._TicksPerSecond
+
+
+class Task:
+    """
+    A timeout or interval, queued in the Scheduler of its manager
+    """
     def __init__(self, mgr: RoomManager, timeout: int, func: Callable[..., None],
                  isInterval: bool, args: ..., kw: ...):
-        Task._counter += 1
-
         self.mgr = mgr
-        self.target = time.time() + timeout
-        self.counter = Task._counter
+        self.scheduler = mgr._scheduler
+        with self.scheduler._lock:
+            self.scheduler._counter += 1
+            self.counter = self.scheduler._counter
+
+        # Clock.monotonic based
+        self.target = mgr._clock.monotonic() + timeout
         self.timeout = timeout
         self.func = func
         self.isInterval = isInterval
         self.args = args
         self.kw = kw
         self.cancelled = False
+        # wheel position, see _TimerWheel
+        self._tick = 0
+        self._slot: tuple[int, dict[Task, None]] | None = None
 
         if timeout < 0:
             self.queued = True
-            if isInterval:
-                Task._tasks.add(self)
-            else:
-                Task._tasks_once.add(self)
+            self.scheduler._addEveryTick(self)
         else:
             self.queued = False
             self.queue()
 
     def cancel(self):
         """
-        Mark task as canceled without removing from the list
-
-        Because removing from the list would require reheapifying the list
+        Mark task as canceled and remove it from the scheduler
         """
-        Task._removed += 1
-        self.cancelled = True
+        self.scheduler._remove(self)
 
     def queue(self):
         """
         A helper function for queuing the task into the task queue
         """
-        if not self.queued:
-            self.queued = True
-            heapq.heappush(Task._tasks_queue, (self.target, self.counter, self))
+        self.scheduler._queue(self)
 
     def size(self):
-        """Return the number of task queued, excluding cancelled task"""
-        return len(Task._tasks_queue) + len(Task._tasks) + len(Task._tasks_once) - Task._removed  # noqa: E501
+        """Return the number of task queued in the scheduler of this task"""
+        return self.scheduler.size()
+
+
+class Scheduler:
+    """
+    Better Deterministic Task Manager using a timer wheel
+
+    Every RoomManager has its own, ticked by its main loop,
+    so the timers of the managers of a process don't mix.
+    """
+    def __init__(self, mgr: RoomManager):
+        self.mgr = mgr
+        self._wheel = _TimerWheel(mgr._clock.monotonic())
+        self._tasks_once: set[Task] = set()
+        self._tasks: set[Task] = set()
+        # Task counter/id to serve as tie breaker
+        # if there are multiple conflicting time target
+        self._counter: int = 0
+
+        self.running_task: None | Task = None
+
+        # tasks can be added from other threads than the main loop one
+        self._lock = threading.RLock()
+
+    def _addEveryTick(self, task: Task):
+        with self._lock:
+            if task.isInterval:
+                self._tasks.add(task)
+            else:
+                self._tasks_once.add(task)
+        self._wake()
+
+    def _queue(self, task: Task):
+        with self._lock:
+            if not task.queued:
+                task.queued = True
+                self._wheel.add(task)
+        self._wake()
+
+    def _remove(self, task: Task):
+        with self._lock:
+            if not task.cancelled:
+                task.cancelled = True
+                if task.timeout < 0:
+                    self._tasks.discard(task)
+                    self._tasks_once.discard(task)
+                else:
+                    self._wheel.remove(task)
+
+    def _wake(self):
+        """Called when a task is added, wake the main loop up so it recomputes its wait"""
+        loop = self.mgr._loopThread
+        if loop is not None and loop is not threading.current_thread():
+            self.mgr._waker.wake()
+
+    def size(self):
+        """Return the number of task queued, cancelled task are removed right away"""
+        return len(self._wheel) + len(self._tasks) + len(self._tasks_once)
 
     # TODO: figure out if there a naming convention for iter/yield function name
     # like there is for length, queue.qsize
-    @staticmethod
-    def _yield_tasks(now: float) -> Generator[Task, None, None]:
+    def _yield_tasks(self, now: float) -> Generator[Task, None, None]:
         """Yield the overdue tasks"""
-        while Task._tasks_queue and (Task._tasks_queue[0][0] <= now or
-                                     Task._tasks_queue[0][2].cancelled):
-            _target, _counter, task = heapq.heappop(Task._tasks_queue)
+        due = self._wheel.advance(now)
+        if len(due) > 1:
+            due.sort(key=lambda task: (task.target, task.counter))
+        for task in due:
             task.queued = False
             yield task
 
         # We don't set the queued to False for `run on next tick` tasks
         # so it doesn't get added to the regular queue
-        yield from Task._tasks
+        yield from list(self._tasks)
 
-        yield from Task._tasks_once
-        Task._tasks_once.clear()
+        yield from self._tasks_once
+        self._tasks_once.clear()
 
-    @staticmethod
-    def get_next_tick_target() -> float | None:
-        while Task._tasks_queue:
-            target, _tid, task = Task._tasks_queue[0]
-            if task.cancelled:
-                heapq.heappop(Task._tasks_queue)
-                continue
-            return target
+    def get_next_tick_target(self) -> float | None:
+        """Clock.monotonic of the next task, None if no task"""
+        with self._lock:
+            return self._wheel.nextTarget()
 
-    @staticmethod
-    def tick() -> float | None:
+    def tick(self) -> float | None:
         """
         Process the tasks
 
         @return: time in seconds to the next task or None if no task
         """
-        # TODO: Add performance related data gathering and warning if a task took too long
-        now = time.time()
-        tasks: list[Task] = []
+        now = self.mgr._clock.monotonic()
+        if (tracer := self.mgr._tracer) is not None:
+            tickStart = time.perf_counter()
 
-        for task in Task._yield_tasks(now):
-            if task.cancelled:
-                Task._removed -= 1
-            else:
-                tasks.append(task)
+        with self._lock:
+            tasks = list(self._yield_tasks(now))
 
         for task in tasks:
-            Task.running_task = task
+            # cancelled by a task run before it
+            if task.cancelled:
+                continue
+            self.running_task = task
+            start = time.perf_counter()
             task.func(*task.args, **task.kw)
-            if task.isInterval:
+            name = _funcName(task.func)
+            self.mgr._ran(name, time.perf_counter() - start)
+            if tracer is not None:
+                tracer.add(name, "task", start)
+            if task.isInterval and not task.cancelled:
                 task.target = now + task.timeout
                 task.queue()
 
-        Task.running_task = None
+        self.running_task = None
+        if tracer is not None:
+            tracer.add("tick", "loop", tickStart)
+
+        if target := self.get_next_tick_target():
+            return max(target - now, 0)
+
+
+class Tracer:
+    """
+    Ring buffer of main loop spans, exported as Chrome trace-event JSON
+
+    Open the dump in chrome://tracing or https://ui.perfetto.dev,
+    see RoomManager.enableTracing. Can be shared by several managers.
+    """
+    def __init__(self, size: int = 100000):
+        """
+        @param size: max amount of spans kept, the oldest are dropped first
+        """
+        # (name, category, start, duration, thread id, room name)
+        self._spans: collections.deque[tuple[str, str, float, float, int, str | None]] = \
+            collections.deque(maxlen=size)
+
+    def __len__(self):
+        return len(self._spans)
+
+    def add(self, name: str, cat: str, start: float, conn: Optional[Conn] = None):
+        """
+        Record a span from start (time.perf_counter) to now
+
+        @param name: span name
+        @param cat: category
+        @param conn: Room or PM it happened in
+        """
+        self._spans.append((name, cat, start, time.perf_counter() - start,
+                            threading.get_ident(), getattr(conn, "name", None)))
 
-        if target := Task.get_next_tick_target():
-            return target - now
+    def clear(self):
+        self._spans.clear()
+
+    def getTrace(self) -> dict[str, Any]:
+        """
+        Get the recorded spans
+
+        @return: trace-event JSON object
+        """
+        pid = os.getpid()
+        events: list[dict[str, Any]] = []
+        tids: set[int] = set()
+        for name, cat, start, duration, tid, room in list(self._spans):
+            event = {"name": name, "cat": cat, "ph": "X", "ts": start * 1e6,
+                     "dur": duration * 1e6, "pid": pid, "tid": tid}
+            if room is not None:
+                event["args"] = {"room": room}
+            events.append(event)
+            tids.add(tid)
+        for thread in threading.enumerate():
+            if thread.ident in tids:
+                events.append({"name": "thread_name", "ph": "M", "pid": pid,
+                               "tid": thread.ident, "args": {"name": thread.name}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump(self, path: Optional[str] = None) -> str:
+        """
+        Write the recorded spans to a file
+
+        @param path: file to write, default to ch-trace-<pid>.json
+
+        @return: the path written
+        """
+        if path is None:
+            path = f"ch-trace-{os.getpid()}.json"
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.getTrace(), file)
+        return path
+
+    def dumpOnSignal(self, signum: Optional[int] = None, path: Optional[str] = None):
+        """
+        Dump the spans whenever the process gets a signal, call from the main thread
+
+        @param signum: signal, default to SIGUSR1, required where there is no
+            SIGUSR1 (windows, e.g. signal.SIGBREAK)
+        @param path: file to write, see dump
+        """
+        if signum is None:
+            if not hasattr(signal, "SIGUSR1"):
+                raise ValueError("no SIGUSR1 on this platform, signum is required")
+            signum = signal.SIGUSR1
+        signal.signal(signum, lambda _signum, _frame: self.dump(path))
 
 
 class Conn(Protocol):
@@ -501,17 +1018,63 @@ class Conn(Protocol):
     of a Conn object like Room and PM
     """
     sock: socket.socket
+    connected: bool
+    lastSent: float
 
     @property
     def pendingWrite(self) -> bool:
         ...
 
+    @property
+    def idle(self) -> bool:
+        ...
+
     def rfeed(self):
         ...
 
     def wfeed(self):
         ...
 
+    def ping(self):
+        ...
+
+    def disconnect(self):
+        ...
+
+
+class _Waker:
+    """
+    Self-pipe registered in the main loop, written to by other threads
+    to wake the loop up for `RoomManager.callFromThread` callbacks
+    """
+    pendingWrite = False
+
+    def __init__(self, mgr: RoomManager):
+        self._mgr = mgr
+        self.connected = True
+        # socketpair instead of os.pipe so it also works with select on windows
+        self.sock, self._wsock = socket.socketpair()
+        self.sock.setblocking(False)
+        self._wsock.setblocking(False)
+
+    def wake(self):
+        try:
+            self._wsock.send(b"\x00")
+        except OSError:
+            # buffer full means a wakeup is already pending
+            pass
+
+    def rfeed(self):
+        try:
+            while self.sock.recv(4096):
+                pass
+        except OSError:
+            pass
+        self._mgr._runThreadCalls()
+
+    def wfeed(self):
+        ...
+
     def disconnect(self):
         ...
 
@@ -526,6 +1089,8 @@ class PM:
     ####
     PMHost = "c1.chatango.com"
     PMPort = 5222
+    # seconds to wait for the login request, done off the main loop
+    authTimeout = 10.0
 
     def __init__(self, mgr: RoomManager):
         self.connected = False
@@ -551,11 +1116,37 @@ class PM:
         self._mgr = mgr
         self._wlock = False
         self._firstCommand = True
-        self._wbuf = bytearray()
-        self._wlockbuf = bytearray()
+        self._wbuf = _SendQueue()
+        self._wlockbuf: list[tuple[bytes, Send_Priority]] = []
+        self._wlocksize = 0
+        # send syscalls and fully sent commands, for syscalls per command
+        self.sendCalls = 0
+        self.sentCommands = 0
+        # chat commands dropped or merged due to writeHighWater
+        self.droppedChat = 0
+        self.mergedChat = 0
+        # reassembly buffer, starts empty and is released once the frames are processed,
+        # reads go through the scratch buffer shared by every conn of the manager
         self._rbuf = bytearray()
-        self._sbuf = bytearray(2**14)
-        self._pingTask = None
+        # dropping the rest of an oversized frame
+        self._rdiscard = False
+        # times rfeed stopped reading because of the manager read budget
+        self.readBudgetHits = 0
+        # frames dropped or disconnected on for exceeding the manager maxFrameSize
+        self.oversizedFrames = 0
+        # time of the last data received, and of the ping waiting for data since
+        self.lastReceived = 0.0
+        # time of the last data sent, pings are skipped while sending anyway
+        self.lastSent = 0.0
+        # time the ping got flushed to the socket, and whether one is still queued
+        self._pingSent: float | None = None
+        self._pingQueued = False
+        # time from a ping being sent to the server answering it, smoothed (EWMA) and max
+        self.pingRtt: float | None = None
+        self.pingRttMax = 0.0
+        # automatic reconnects since the last successful one, see RoomManager.autoReconnect
+        self._reconnectAttempts = 0
+        self._reconnectTask: Task | None = None
         self._connect()
 
     ####
@@ -563,14 +1154,48 @@ class PM:
     ####
     def _connect(self):
         self._wbuf.clear()
+        self._wlock = False
+        self._wlockbuf.clear()
+        self._wlocksize = 0
+        self._rbuf.clear()
+        self._rdiscard = False
         self._firstCommand = True
-        if self._auth():
-            self.sock = socket.socket()
-            self.sock.setblocking(False)
-            self.sock.connect_ex((self.PMHost, self.PMPort))
+        self.lastReceived = self.lastSent = self._mgr._clock.time()
+        self._pingSent = None
+        self._pingQueued = False
+        self.sock = socket.socket()
+        self.sock.setblocking(False)
+        self._mgr.addPMConnection(self)
+        self.connected = True
+        # the login is a blocking http request, the connect starts once it is done
+        self._auth()
+
+    def _authed(self, sock: socket.socket, auid: str | None):
+        """Connect once logged in, see _auth"""
+        if sock is not self.sock or not self.connected:
+            # disconnected or reconnected in the meantime
+            return
+        if auid is None:
+            self._disconnect()
+            self._mgr._callEvent(self, "onLoginFail")
+            # most likely the network being down when reconnecting
+            if self._mgr.autoReconnect and self._mgr._running:
+                self._scheduleReconnect()
+            return
+        self._sendCommand("tlogin", auid, "2")
+        self._setWriteLock(True)
+        self._mgr._resolve(self.PMHost, self.PMPort,
+                           functools.partial(self._resolved, self.sock))
 
-            self._pingTask = self._mgr.setInterval(self._mgr.pingDelay, self.ping)
-            self.connected = True
+    def _resolved(self, sock: socket.socket, addr: tuple[Any, ...] | None):
+        """Start connecting once PMHost is resolved"""
+        if sock is not self.sock or not self.connected:
+            return
+        if addr is None:
+            self.disconnect()
+            return
+        sock.connect_ex(addr)
+        self._mgr._register(self)
 
     def _getAuth(self, name: str, password: str) -> str | None:
         """
@@ -589,8 +1214,10 @@ class PM:
         }).encode()
 
         try:
-            headers = urllib.request.urlopen("http://chatango.com/login", data).headers
-        except urllib.error.HTTPError as error:
+            headers = urllib.request.urlopen("http://chatango.com/login", data,
+                                             timeout=self.authTimeout).headers
+        except OSError as error:
+            # URLError and HTTPError included
             print("[PM][Auth]", error)
             return None
 
@@ -600,23 +1227,45 @@ class PM:
                     return m.group(1) or None
 
     def _auth(self):
-        auid = self._getAuth(self._mgr.name, self._mgr.password)
-        if auid is None:
-            self._mgr._callEvent(self, "onLoginFail")
-            return False
-        self._sendCommand("tlogin", auid, "2")
-        self._setWriteLock(True)
-        return True
+        """Request an auid off the main loop, see _authed"""
+        self._mgr.deferToThread(functools.partial(self._authed, self.sock),
+                                self._getAuth, self._mgr.name, self._mgr.password)
+
+    def reconnect(self):
+        """Reconnect."""
+        self._cancelReconnect()
+        if self.connected:
+            self._disconnect()
+        self._connect()
 
     def disconnect(self):
         """Disconnect the bot from PM"""
+        self._cancelReconnect()
         self._disconnect()
         self._mgr._callEvent(self, "onPMDisconnect")
 
+    def _lost(self):
+        """The connection went idle, disconnect and reconnect later if autoReconnect"""
+        self._disconnect()
+        if self._mgr.autoReconnect and self._mgr._running:
+            self._scheduleReconnect()
+        self._mgr._callEvent(self, "onPMDisconnect")
+
+    def _scheduleReconnect(self):
+        """Reconnect after the same backoff as the rooms"""
+        delay = self._mgr._reconnectBackoff(self._reconnectAttempts)
+        self._reconnectAttempts += 1
+        self._reconnectTask = self._mgr.setTimeout(delay, self.reconnect)
+
+    def _cancelReconnect(self):
+        if self._reconnectTask is not None:
+            self._reconnectTask.cancel()
+            self._reconnectTask = None
+
     def _disconnect(self):
         self.connected = False
-        self.sock.close()
         self._mgr.removePMConnection()
+        self.sock.close()
 
     def _updateStatus(self, user: User, status: str, timestamp: int, idle_duration: str = "0"):
         if status == "off" or status == "offline":
@@ -639,31 +1288,121 @@ class PM:
     def pendingWrite(self) -> bool:
         return bool(self._wbuf)
 
-    def feed_tick(self):
-        # wait till entire message is received, message is delimited by 0
-        if self._rbuf[-1] == 0:
-            del self._rbuf[-1]
+    @property
+    def idle(self) -> bool:
+        """Whether nothing got received within the manager idleTimeout"""
+        idleTimeout = self._mgr.idleTimeout
+        return bool(idleTimeout) and self._mgr._clock.time() - self.lastReceived > idleTimeout
+
+    def feed_tick(self) -> int:
+        """
+        Process the received data
+
+        @return: number of frames processed
+        """
+        if self._rdiscard:
+            # still dropping the rest of an oversized frame
+            if (start := self._rbuf.find(0)) == -1:
+                self._rbuf.clear()
+                return 0
+            del self._rbuf[:start + 1]
+            self._rdiscard = False
+
+        # process every complete frame, frames are delimited by 0,
+        # the partial frame at the end is kept till the rest is received
+        if (end := self._rbuf.rfind(0)) == -1:
+            if len(self._rbuf) > self._mgr.maxFrameSize:
+                self._oversizedFrame()
+            return 0
 
-            lines = self._rbuf.decode().split("\x00")
-            for line in lines:
-                self._process(line.rstrip("\r\n"))
-            self._rbuf.clear()
+        frames = self._rbuf[:end].split(b"\x00")
+        # removed before processing as _process can disconnect and reset the buffer
+        del self._rbuf[:end + 1]
+
+        # frames without a handler are only decoded if they are needed for onRaw
+        commands = _getCommands(type(self))
+        raw = self._mgr._wantsRaw()
+        ignored = self._mgr._ignoredCommands
+        processed, skipped = self._mgr._processedFrames, self._mgr._skippedFrames
+        for frame in frames:
+            if (i := frame.find(b":")) == -1:
+                cmd = bytes(frame.rstrip(b"\r\n"))
+                if not cmd:
+                    # the answer to a ping
+                    self._pong()
+            else:
+                cmd = bytes(frame[:i])
+            if cmd in ignored or not (raw or cmd in commands):
+                skipped[cmd] += 1
+                continue
+            processed[cmd] += 1
+            self._process(frame.decode().rstrip("\r\n"))
+
+        if len(self._rbuf) > self._mgr.maxFrameSize:
+            self._oversizedFrame()
+        return len(frames)
+
+    def _oversizedFrame(self):
+        self.oversizedFrames += 1
+        self._rbuf.clear()
+        if self._mgr.oversizedFrame is OversizedFrame_Mode.Disconnect:
+            print("[PM][feed_tick] Frame bigger than maxFrameSize, disconnecting")
+            self.disconnect()
+        else:
+            print("[PM][feed_tick] Frame bigger than maxFrameSize, dropping it")
+            self._rdiscard = True
+
+    def _received(self):
+        """Update lastReceived"""
+        self.lastReceived = self._mgr._clock.time()
+
+    def _pong(self):
+        """The server answered the ping, update the ping round trip"""
+        if self._pingSent is not None:
+            rtt = self._mgr._clock.time() - self._pingSent
+            self._pingSent = None
+            if self.pingRtt is None:
+                self.pingRtt = rtt
+            else:
+                self.pingRtt += self._mgr.pingRttAlpha * (rtt - self.pingRtt)
+            self.pingRttMax = max(self.pingRttMax, rtt)
 
     def rfeed(self):
+        # read till EAGAIN, within the budget so a flood can't starve other conns
+        sock = self.sock
+        sbuf = self._mgr._sbuf
+        nbytes = self._mgr.readBudget
+        frames = self._mgr.readFrameBudget
         try:
-            size = self.sock.recv_into(self._sbuf)
-            if size > 0:
-                self._rbuf += self._sbuf[:size]
-                self.feed_tick()
-            else:
-                self.disconnect()
+            # _process might disconnect
+            while sock is self.sock and self.connected:
+                if nbytes <= 0 or frames <= 0:
+                    self.readBudgetHits += 1
+                    break
+                size = sock.recv_into(sbuf)
+                if size > 0:
+                    self._received()
+                    self._rbuf += sbuf[:size]
+                    nbytes -= size
+                    frames -= self.feed_tick()
+                else:
+                    self.disconnect()
+                    break
+        except BlockingIOError:
+            pass
         except socket.error as error:
             print("[PM][rfeed] Socket error", error)
 
     def wfeed(self):
         try:
-            size = self.sock.send(self._wbuf)
-            del self._wbuf[:size]
+            self.sentCommands += self._wbuf.send(self.sock)
+            self.sendCalls += 1
+            self.lastSent = self._mgr._clock.time()
+            if self._pingQueued and self._wbuf.watch is None:
+                self._pingQueued = False
+                self._pingSent = self.lastSent
+            if not self._wbuf:
+                self._mgr._setWriteInterest(self, False)
         except socket.error as error:
             print("[PM][wfeed] Socket error", error)
 
@@ -682,17 +1421,23 @@ class PM:
         self._mgr._callEvent(self, "onRaw", data)
         cmd, *args = data.split(":")
         func = "_rcmd_" + cmd
+        if (tracer := self._mgr._tracer) is not None:
+            start = time.perf_counter()
         try:
             getattr(self, func)(args)
         except AttributeError:
             if debug:
                 print("unknown data: "+str(data))
+        else:
+            if tracer is not None:
+                tracer.add(func, "rcmd", start, self)
 
     ####
     # Received Commands
     ####
     def _rcmd_OK(self, _args: list[str]):
         self._setWriteLock(False)
+        self._reconnectAttempts = 0
         self._sendCommand("wl")
         self._sendCommand("getblock")
         self._mgr._callEvent(self, "onPMConnect")
@@ -820,15 +1565,28 @@ class PM:
     # Commands
     ####
     def ping(self):
-        """send a ping"""
-        self._sendCommand("")
+        """send a ping, or reconnect if nothing got received within the manager idleTimeout"""
+        if self.idle:
+            print("[PM][ping] Nothing received within idleTimeout, reconnecting")
+            self._lost()
+            return
+        if self._pingSent is None and not self._pingQueued:
+            # timed from being flushed, see wfeed, copied so it can be told apart
+            # from the other empty commands by identity
+            data = bytes(bytearray(self._encodeCommand("")))
+            self._pingQueued = True
+            self._wbuf.watch = data
+            self._write(data, _sendPriorities.get("", Send_Priority.Control))
+        else:
+            self._sendCommand("")
         self._mgr._callEvent(self, "onPMPing")
 
-    def message(self, user: User, msg: str):
-        """send a pm to a user"""
+    def message(self, user: User, msg: str) -> bool:
+        """send a pm to a user, return False if dropped due to backpressure"""
         if msg != "":
             msg = msg.replace('\n', '\r')
-            self._sendCommand("msg", user.name, msg)
+            return self._sendCommand("msg", user.name, msg)
+        return True
 
     def addContact(self, user: User):
         """add contact"""
@@ -880,30 +1638,60 @@ class PM:
     ####
     # Util
     ####
-    def _write(self, data: bytes):
+    @property
+    def writeBackpressure(self) -> bool:
+        """Whether more than the manager writeHighWater is waiting to be sent"""
+        return self._wbuf.size + self._wlocksize >= self._mgr.writeHighWater
+
+    def _write(self, data: bytes, priority: Send_Priority = Send_Priority.Control) -> bool:
+        """
+        Queue data to be sent
+
+        @return: False if the data was dropped due to backpressure
+        """
+        if priority is Send_Priority.Chat and self.writeBackpressure:
+            self.droppedChat += 1
+            return False
+        self._queue(data, priority)
+        return True
+
+    def _queue(self, data: bytes, priority: Send_Priority):
+        """Queue data to be sent, regardless of the backpressure"""
         if self._wlock:
-            self._wlockbuf += data
-        else:
-            self._wbuf += data
+            self._wlockbuf.append((data, priority))
+            self._wlocksize += len(data)
+        elif data:
+            if not self._wbuf:
+                self._mgr._setWriteInterest(self, True)
+            self._wbuf.append(data, priority)
 
     def _setWriteLock(self, lock: bool):
         self._wlock = lock
         if self._wlock is False:
-            self._write(self._wlockbuf)
+            self._wlocksize = 0
+            # already accepted, not subject to the backpressure again
+            for data, priority in self._wlockbuf:
+                self._queue(data, priority)
             self._wlockbuf.clear()
 
-    def _sendCommand(self, *args: str):
+    def _sendCommand(self, *args: str) -> bool:
         """
         Send a command.
 
         @param args: command and list of arguments
+
+        @return: False if the command was dropped due to backpressure
         """
+        return self._write(self._encodeCommand(*args),
+                           _sendPriorities.get(args[0], Send_Priority.Control))
+
+    def _encodeCommand(self, *args: str) -> bytes:
         if self._firstCommand:
             terminator = b"\x00"
             self._firstCommand = False
         else:
             terminator = b"\r\n\x00"
-        self._write(":".join(args).encode() + terminator)
+        return ":".join(args).encode() + terminator
 
 
 ################################################################
@@ -925,13 +1713,54 @@ class Room:
         # Under the hood
         self.connected = False
         self._reconnecting = False
+        # automatic reconnects since the last successful one, see RoomManager.autoReconnect
+        self._reconnectAttempts = 0
+        self._reconnectTask: Task | None = None
         self._provided_uid = uid
         self.uid: str = self._provided_uid or _genUid()
 
-        self._sbuf = bytearray(2**14)
+        # reassembly buffer, starts empty and is released once the frames are processed,
+        # reads go through the scratch buffer shared by every conn of the manager
         self._rbuf = bytearray()
-        self._wbuf = bytearray()
-        self._wlockbuf = bytearray()
+        self._wbuf = _SendQueue()
+        self._wlockbuf: list[tuple[bytes, Send_Priority]] = []
+        self._wlocksize = 0
+        # send syscalls and fully sent commands, for syscalls per command
+        self.sendCalls = 0
+        self.sentCommands = 0
+        # chat commands dropped or merged due to writeHighWater
+        self.droppedChat = 0
+        self.mergedChat = 0
+        # last queued chat command and its message, for merging
+        self._lastChat: tuple[bytes, str] | None = None
+        # chat pacing token bucket, see the manager maxMessageRate,
+        # messageRate is lowered on flood warnings and slowly recovers
+        # set from the manager once connecting
+        self.messageRate: float | None = None
+        self._tokens = 0.0
+        self._tokensTime = 0.0
+        self._lastFloodWarning = 0.0
+        # messages (and their encoded command if shared) waiting for a token,
+        # and their total size once encoded, see _chatSize
+        self._paced: collections.deque[tuple[str, bytes | None]] = collections.deque()
+        self._pacedSize = 0
+        self._paceTask: Task | None = None
+        # dropping the rest of an oversized frame
+        self._rdiscard = False
+        # times rfeed stopped reading because of the manager read budget
+        self.readBudgetHits = 0
+        # frames dropped or disconnected on for exceeding the manager maxFrameSize
+        self.oversizedFrames = 0
+        # time of the last data received, and of the ping waiting for data since
+        self.lastReceived = 0.0
+        # time of the last data sent, pings are skipped while sending anyway
+        self.lastSent = 0.0
+        # time the ping got flushed to the socket, and whether one is still queued
+        self._pingSent: float | None = None
+        self._pingQueued = False
+        # time from a ping being sent to the server answering it, smoothed (EWMA) and max
+        self.pingRtt: float | None = None
+        self.pingRttMax = 0.0
 
         self.owner: User
         self._mods: set[User] = set()
@@ -952,9 +1781,10 @@ class Room:
         self._connectAmount = 0
         self.premium = False
         self.usercount = 0
-        self.pingTask: Task
         self._bot_name: str = ""
         self._login_name = ""
+        # rendered name/font tags of the messages, reset when they change
+        self._prefix: str | None = None
         self._anon_name = ""
         self._anon_n = ""
         self.users: dict[str, User] = dict()
@@ -966,6 +1796,9 @@ class Room:
 
         # Inited vars
         if self._mgr:
+            self.messageRate = mgr.maxMessageRate
+            self._tokens = float(mgr.messageBurst)
+            self._tokensTime = mgr._clock.time()
             self._connect()
 
     ####
@@ -975,16 +1808,44 @@ class Room:
         """Connect to the server."""
         self.sock = socket.socket()
         self.sock.setblocking(False)
-        self.sock.connect_ex((self._server, self._port))
-        self._mgr.addConnection(self)
         self._firstCommand = True
         self._wbuf.clear()
+        # a conn lost before inited is still write locked
+        self._wlock = False
+        self._wlockbuf.clear()
+        self._wlocksize = 0
+        self._rbuf.clear()
+        self._rdiscard = False
+        self.lastReceived = self.lastSent = self._mgr._clock.time()
+        self._pingSent = None
+        self._pingQueued = False
+        self._mgr.addConnection(self)
         self._auth()
-        self.pingTask: Task = self._mgr.setInterval(self._mgr.pingDelay, self.ping)
         self.connected = True
+        # the server is resolved off the main loop, the auth is sent once connected
+        self._mgr._resolve(self._server, self._port, functools.partial(self._resolved, self.sock))
+
+    def _resolved(self, sock: socket.socket, addr: tuple[Any, ...] | None):
+        """Start connecting once the server is resolved"""
+        if sock is not self.sock or not self.connected:
+            # disconnected or reconnected in the meantime
+            return
+        if addr is None:
+            self._disconnect()
+            self._mgr._callEvent(self, "onConnectFail")
+            # might be a temporary failure
+            if self._mgr.autoReconnect and self._mgr._running:
+                self._scheduleReconnect()
+            else:
+                self._mgr._joinDone(self, False)
+            return
+        sock.connect_ex(addr)
+        self._mgr._register(self)
 
     def reconnect(self):
         """Reconnect."""
+        # joinRooms keeps waiting, this is the reconnect it waits for
+        self._dropReconnect()
         self._reconnecting = True
         if self.connected:
             self._disconnect()
@@ -994,18 +1855,64 @@ class Room:
 
     def disconnect(self):
         """Disconnect."""
+        self._cancelReconnect()
+        if self._mgr._rooms.get(self.name) is not self:
+            # already lost, only the pending reconnect had to go
+            return
         self._disconnect()
         self._mgr._callEvent(self, "onDisconnect")
 
+    def _lost(self):
+        """The connection got lost, disconnect and reconnect later if autoReconnect"""
+        self._disconnect()
+        # scheduled before onDisconnect, so joinRoom or reconnect from within it
+        # get the pending reconnect instead of racing it
+        if self._mgr.autoReconnect and self._mgr._running:
+            self._scheduleReconnect()
+        else:
+            self._mgr._joinDone(self, False)
+        self._mgr._callEvent(self, "onDisconnect")
+
+    def _scheduleReconnect(self):
+        """Reconnect after an exponential backoff with jitter"""
+        mgr = self._mgr
+        delay = mgr._reconnectBackoff(self._reconnectAttempts)
+        self._reconnectAttempts += 1
+        mgr._reconnectWaiting[self.name] = self
+        self._reconnectTask = mgr.setTimeout(delay, mgr._queueReconnect, self)
+
+    def _cancelReconnect(self):
+        """Drop the pending reconnect, failing the joinRooms that kept waiting on it"""
+        self._dropReconnect()
+        self._mgr._joinDone(self, False)
+
+    def _dropReconnect(self):
+        if self._reconnectTask is not None:
+            self._reconnectTask.cancel()
+            self._reconnectTask = None
+        if self._mgr._reconnectWaiting.get(self.name) is self:
+            del self._mgr._reconnectWaiting[self.name]
+        if self in self._mgr._reconnectQueue:
+            self._mgr._reconnectQueue.remove(self)
+
     def _disconnect(self):
         """Disconnect from the server."""
         self.connected = False
         for user in self._userlist:
             user.clearSessionIds(self)
         self._userlist = list()
-        self.pingTask.cancel()
-        self.sock.close()
+        # joinRooms is told by the callers, unless a reconnect is pending
+        if not self._reconnecting:
+            # failed or aborted before getting inited
+            self._mgr._reconnectDone(self)
+        if self._paceTask is not None:
+            self._paceTask.cancel()
+            self._paceTask = None
+        self._paced.clear()
+        self._pacedSize = 0
+        # unregister before closing, the selector can't look up a closed socket
         self._mgr.removeConnection(self)
+        self.sock.close()
 
     def _auth(self):
         """Authenticate."""
@@ -1029,6 +1936,17 @@ class Room:
     def pendingWrite(self) -> bool:
         return bool(self._wbuf)
 
+    @property
+    def idle(self) -> bool:
+        """Whether nothing got received within the manager idleTimeout"""
+        idleTimeout = self._mgr.idleTimeout
+        return bool(idleTimeout) and self._mgr._clock.time() - self.lastReceived > idleTimeout
+
+    @property
+    def pacedMessages(self) -> int:
+        """Amount of messages waiting to be sent by the chat pacing"""
+        return len(self._paced)
+
     def getUserlist(self, mode: Optional[Userlist_Mode] = None,
                     unique: Optional[bool] = None, memory: Optional[int] = None):
         ul = []
@@ -1073,32 +1991,121 @@ class Room:
     ####
     # Feed/process
     ####
-    def feed_tick(self):
-        # wait till entire message is received, message is delimited by 0
-        if self._rbuf[-1] == 0:
-            del self._rbuf[-1]
-            lines = self._rbuf.decode(errors='ignore').split("\x00")
-            for line in lines:
-                self._process(line.rstrip("\r\n"))
-            self._rbuf.clear()
+    def feed_tick(self) -> int:
+        """
+        Process the received data
+
+        @return: number of frames processed
+        """
+        if self._rdiscard:
+            # still dropping the rest of an oversized frame
+            if (start := self._rbuf.find(0)) == -1:
+                self._rbuf.clear()
+                return 0
+            del self._rbuf[:start + 1]
+            self._rdiscard = False
+
+        # process every complete frame, frames are delimited by 0,
+        # the partial frame at the end is kept till the rest is received
+        if (end := self._rbuf.rfind(0)) == -1:
+            if len(self._rbuf) > self._mgr.maxFrameSize:
+                self._oversizedFrame()
+            return 0
+
+        frames = self._rbuf[:end].split(b"\x00")
+        # removed before processing as _process can disconnect and reset the buffer
+        del self._rbuf[:end + 1]
+
+        # frames without a handler are only decoded if they are needed for onRaw
+        commands = _getCommands(type(self))
+        raw = self._mgr._wantsRaw()
+        ignored = self._mgr._ignoredCommands
+        processed, skipped = self._mgr._processedFrames, self._mgr._skippedFrames
+        for frame in frames:
+            if (i := frame.find(b":")) == -1:
+                cmd = bytes(frame.rstrip(b"\r\n"))
+                if not cmd:
+                    # the answer to a ping
+                    self._pong()
+            else:
+                cmd = bytes(frame[:i])
+            if cmd in ignored or not (raw or cmd in commands):
+                skipped[cmd] += 1
+                continue
+            processed[cmd] += 1
+            self._process(frame.decode(errors='ignore').rstrip("\r\n"))
+
+        if len(self._rbuf) > self._mgr.maxFrameSize:
+            self._oversizedFrame()
+        return len(frames)
+
+    def _oversizedFrame(self):
+        self.oversizedFrames += 1
+        self._rbuf.clear()
+        if self._mgr.oversizedFrame is OversizedFrame_Mode.Disconnect:
+            print("[Room][feed_tick] Frame bigger than maxFrameSize, disconnecting")
+            self.disconnect()
+        else:
+            print("[Room][feed_tick] Frame bigger than maxFrameSize, dropping it")
+            self._rdiscard = True
+
+    def _received(self):
+        """Update lastReceived"""
+        self.lastReceived = self._mgr._clock.time()
+
+    def _pong(self):
+        """The server answered the ping, update the ping round trip"""
+        if self._pingSent is not None:
+            rtt = self._mgr._clock.time() - self._pingSent
+            self._pingSent = None
+            if self.pingRtt is None:
+                self.pingRtt = rtt
+            else:
+                self.pingRtt += self._mgr.pingRttAlpha * (rtt - self.pingRtt)
+            self.pingRttMax = max(self.pingRttMax, rtt)
 
     def rfeed(self):
+        # read till EAGAIN, within the budget so a flood can't starve other conns
+        sock = self.sock
+        sbuf = self._mgr._sbuf
+        nbytes = self._mgr.readBudget
+        frames = self._mgr.readFrameBudget
         try:
-            size = self.sock.recv_into(self._sbuf)
-            if size > 0:
-                self._rbuf += self._sbuf[:size]
-                self.feed_tick()
-            else:
-                self.disconnect()
+            # _process might disconnect or reconnect with a new socket
+            while sock is self.sock and self.connected:
+                if nbytes <= 0 or frames <= 0:
+                    self.readBudgetHits += 1
+                    break
+                size = sock.recv_into(sbuf)
+                if size > 0:
+                    self._received()
+                    self._rbuf += sbuf[:size]
+                    nbytes -= size
+                    frames -= self.feed_tick()
+                else:
+                    self._lost()
+                    break
+        except BlockingIOError:
+            pass
         except socket.error as error:
             print("[Room][rfeed] Socket error", error)
+            self._lost()
 
     def wfeed(self):
         try:
-            size = self.sock.send(self._wbuf)
-            del self._wbuf[:size]
+            self.sentCommands += self._wbuf.send(self.sock)
+            self.sendCalls += 1
+            self.lastSent = self._mgr._clock.time()
+            if self._pingQueued and self._wbuf.watch is None:
+                self._pingQueued = False
+                self._pingSent = self.lastSent
+            if not self._wbuf:
+                self._mgr._setWriteInterest(self, False)
+        except BlockingIOError:
+            pass
         except socket.error as error:
             print("[Room][wfeed] Socket error", error)
+            self._lost()
 
     def _process(self, line: str):
         """
@@ -1116,7 +2123,11 @@ class Room:
         cmd, *args = line.split(":")
         func = "_rcmd_" + cmd
         if hasattr(self, func):
+            if (tracer := self._mgr._tracer) is not None:
+                start = time.perf_counter()
             getattr(self, func)(args)
+            if tracer is not None:
+                tracer.add(func, "rcmd", start, self)
         else:
             if debug:
                 print("unknown data: "+str(line))
@@ -1151,17 +2162,21 @@ class Room:
         self.owner = User(args[0])
         self.uid = args[1]
         self._mods = set(map(lambda x: User(x.split(",")[0]), args[6].split(";")))
+        self._prefix = None
 
     def _rcmd_aliasok(self, _args: list[str]):
         # Successful Setting Temp Name
         self._bot_name = "#"+self._login_name
+        self._prefix = None
 
     def _rcmd_pwdok(self, _args: list[str]):
         # Successful login from anon/temp mode
         self._bot_name = self._login_name
+        self._prefix = None
 
     def _rcmd_denied(self, _args: list[str]):
         self._disconnect()
+        self._mgr._joinDone(self, False)
         self._mgr._callEvent(self, "onConnectFail")
 
     def _rcmd_inited(self, _args: list[str]):
@@ -1184,6 +2199,9 @@ class Room:
             self._i_log.clear()
         self._connectAmount += 1
         self._setWriteLock(False)
+        self._reconnectAttempts = 0
+        self._mgr._reconnectDone(self)
+        self._mgr._joinDone(self, True)
 
     def _rcmd_premium(self, args: list[str]):
         if float(args[1]) > time.time():
@@ -1366,12 +2384,18 @@ class Room:
                 self._mgr._callEvent(self, "onJoin", user, puid)
 
     def _rcmd_show_fw(self, _args: list[str]):
+        if self.messageRate is not None:
+            self._floodWarning(self.messageRate / 2)
         self._mgr._callEvent(self, "onFloodWarning")
 
     def _rcmd_show_tb(self, _args: list[str]):
+        if self.messageRate is not None:
+            self._floodWarning(self._mgr.minMessageRate)
         self._mgr._callEvent(self, "onFloodBan")
 
     def _rcmd_tb(self, _args: list[str]):
+        if self.messageRate is not None:
+            self._floodWarning(self._mgr.minMessageRate)
         self._mgr._callEvent(self, "onFloodBanRepeat")
 
     def _rcmd_delete(self, args: list[str]):
@@ -1449,57 +2473,103 @@ class Room:
         """logout of user in a room"""
         self._sendCommand("blogout")
         self._bot_name = self._anon_name
+        self._prefix = None
 
     def ping(self):
-        """Send a ping."""
-        self._sendCommand("")
+        """Send a ping, or reconnect if nothing got received within the manager idleTimeout"""
+        if self.idle:
+            print("[Room][ping] Nothing received within idleTimeout, reconnecting")
+            self._lost()
+            return
+        if self._pingSent is None and not self._pingQueued:
+            # timed from being flushed, see wfeed, copied so it can be told apart
+            # from the other empty commands by identity
+            data = bytes(bytearray(self._encodeCommand("")))
+            self._pingQueued = True
+            self._wbuf.watch = data
+            self._write(data, _sendPriorities.get("", Send_Priority.Control))
+        else:
+            self._sendCommand("")
         self._mgr._callEvent(self, "onPing")
 
-    def rawMessage(self, msg: str):
+    def rawMessage(self, msg: str) -> bool:
         """
         Send a message without n and f tags.
 
+        Messages are paced by messageRate (see the manager maxMessageRate),
+        the ones over the rate are queued and sent as soon as the rate allows.
+
+        Under backpressure (see writeBackpressure) the message is merged into
+        the last queued message or dropped, depending on the manager chatBackpressure
+
         @param msg: message
+
+        @return: False if the message was dropped
         """
-        if not self.silent:
-            self._sendCommand("bmsg:tl2r", msg)
+        return self._rawMessage(msg)
 
-    def message(self, msg: str, html: bool = False):
+    def _rawMessage(self, msg: str, data: bytes | None = None) -> bool:
         """
-        Send a message. (Use "\n" for new line)
+        rawMessage with the command already encoded, see RoomManager.broadcast
 
         @param msg: message
+        @param data: bmsg command of msg, None to encode it when sent
         """
-        msg = msg.rstrip()
-        if not html:
-            msg = msg.replace("<", "&lt;").replace(">", "&gt;")
+        if self.silent:
+            return True
 
-        if len(msg) > self._mgr.maxLength:
-            if self._mgr.tooBigMessage == BigMessage_Mode.Cut:
-                self.message(msg[:self._mgr.maxLength], html=html)
-            elif self._mgr.tooBigMessage == BigMessage_Mode.Multiple:
-                for index in range(0, len(msg), self._mgr.maxLength):
-                    self.message(msg[index:index+self._mgr.maxLength], html=html)
-            return
+        if self.writeBackpressure:
+            if self._mgr.chatBackpressure is Backpressure_Mode.Merge and self._mergeChat(msg):
+                self.mergedChat += 1
+                return True
+            self.droppedChat += 1
+            return False
 
-        if self._bot_name.startswith("!anon"):
-            # if the bot is current login as anon
-            # use the anon n that was provided by the server
-            msg = "<n" + self._anon_n + "/>" + msg
-        else:
-            msg = "<n" + self.user.nameColor + "/>" + msg
+        if self.messageRate is None:
+            self._sendChat(msg, data)
+            return True
+
+        self._refill()
+        if not self._paced and self._tokens >= 1:
+            self._tokens -= 1
+            self._sendChat(msg, data)
+            return True
+        self._paced.append((msg, data))
+        self._pacedSize += self._chatSize(msg, data)
+        self._schedulePace()
+        return True
+
+    def message(self, msg: str, html: bool = False) -> bool:
+        """
+        Send a message. (Use "\n" for new line)
 
-        if not self._bot_name.startswith("!anon"):
-            font_properties = "<f x%s%s=\"%s\">" % (self.user.fontSize.zfill(2),
-                                                    self.user.fontColor,
-                                                    self.user.fontFace)
-            msg = font_properties + msg
+        @param msg: message
 
-        if "\n" in msg:
-            msg = msg.replace("\n", "\r")
+        @return: False if (part of) the message was dropped due to backpressure
+        """
+        prefix = self._messagePrefix()
+        sent = True
+        for chunk in self._mgr._splitMessage(msg, html):
+            sent = self.rawMessage(_formatMessage(prefix, chunk)) and sent
+        return sent
 
-        msg.replace("~", "&#126;")
-        self.rawMessage(msg)
+    def _messagePrefix(self) -> str:
+        """
+        The name and font tags put in front of the messages
+
+        Cached till the login or the manager name/font changes
+        """
+        if self._prefix is None:
+            if self._bot_name.startswith("!anon"):
+                # if the bot is current login as anon
+                # use the anon n that was provided by the server
+                self._prefix = "<n" + self._anon_n + "/>"
+            else:
+                user = self.user
+                self._prefix = "<f x%s%s=\"%s\">" % (user.fontSize.zfill(2),
+                                                     user.fontColor,
+                                                     user.fontFace) + "<n" + user.nameColor + "/>"
+        return self._prefix
 
     def setBgMode(self, mode: int):
         """turn on/off bg"""
@@ -1681,31 +2751,155 @@ class Room:
             return self._banlist[user]
         return None
 
-    def _write(self, data: bytes):
+    @property
+    def writeBackpressure(self) -> bool:
+        """Whether more than the manager writeHighWater is waiting to be sent"""
+        return self._wbuf.size + self._wlocksize + self._pacedSize >= self._mgr.writeHighWater
+
+    def _write(self, data: bytes, priority: Send_Priority = Send_Priority.Control) -> bool:
+        """
+        Queue data to be sent
+
+        @return: False if the data was dropped due to backpressure
+        """
+        if priority is Send_Priority.Chat and self.writeBackpressure:
+            self.droppedChat += 1
+            return False
+        self._queue(data, priority)
+        return True
+
+    def _queue(self, data: bytes, priority: Send_Priority):
+        """Queue data to be sent, regardless of the backpressure"""
         if self._wlock:
-            self._wlockbuf += data
-        else:
-            self._wbuf += data
+            self._wlockbuf.append((data, priority))
+            self._wlocksize += len(data)
+        elif data:
+            if not self._wbuf:
+                self._mgr._setWriteInterest(self, True)
+            self._wbuf.append(data, priority)
 
     def _setWriteLock(self, lock: bool):
         self._wlock = lock
         if self._wlock is False:
-            self._write(self._wlockbuf)
+            self._wlocksize = 0
+            # already accepted, not subject to the backpressure again
+            for data, priority in self._wlockbuf:
+                self._queue(data, priority)
             self._wlockbuf.clear()
 
-    def _sendCommand(self, *args: str):
+    def _sendCommand(self, *args: str) -> bool:
         """
         Send a command.
 
         @type args: [str, str, ...]
         @param args: command and list of arguments
+
+        @return: False if the command was dropped due to backpressure
         """
+        return self._write(self._encodeCommand(*args),
+                           _sendPriorities.get(args[0], Send_Priority.Control))
+
+    def _encodeCommand(self, *args: str) -> bytes:
         if self._firstCommand:
             terminator = b"\x00"
             self._firstCommand = False
         else:
             terminator = b"\r\n\x00"
-        self._write(":".join(args).encode() + terminator)
+        return ":".join(args).encode() + terminator
+
+    def _mergeChat(self, msg: str) -> bool:
+        """Merge msg into the last queued message if it isn't being sent yet"""
+        if self._paced:
+            # the last message is still waiting on the pacing
+            merged = self._paced[-1][0] + "\r" + msg
+            if len(merged) > self._mgr.maxLength:
+                return False
+            self._pacedSize += self._chatSize(merged) - self._chatSize(*self._paced[-1])
+            self._paced[-1] = (merged, None)
+            return True
+        if self._lastChat is None:
+            return False
+        last, lastmsg = self._lastChat
+        merged = lastmsg + "\r" + msg
+        if len(merged) > self._mgr.maxLength:
+            return False
+
+        if self._wlock:
+            if not self._wlockbuf or self._wlockbuf[-1][0] is not last:
+                return False
+            data = self._encodeCommand("bmsg:tl2r", merged)
+            self._wlockbuf[-1] = (data, Send_Priority.Chat)
+            self._wlocksize += len(data) - len(last)
+        else:
+            if self._wbuf.last(Send_Priority.Chat) is not last:
+                return False
+            data = self._encodeCommand("bmsg:tl2r", merged)
+            self._wbuf.replaceLast(Send_Priority.Chat, data)
+        self._lastChat = (data, merged)
+        return True
+
+    @staticmethod
+    def _chatSize(msg: str, data: bytes | None = None) -> int:
+        """Bytes a chat message takes in the write buffer, like writeHighWater"""
+        if data is not None:
+            return len(data)
+        return len(b"bmsg:tl2r:") + len(msg.encode()) + len(b"\r\n\x00")
+
+    def _sendChat(self, msg: str, data: bytes | None = None):
+        """Queue a chat message, the backpressure is checked by rawMessage"""
+        if data is None or self._firstCommand:
+            data = self._encodeCommand("bmsg:tl2r", msg)
+        self._queue(data, Send_Priority.Chat)
+        self._lastChat = (data, msg)
+
+    ####
+    # Chat pacing
+    ####
+    def _refill(self):
+        """Add the tokens earned since the last refill, recovering messageRate"""
+        now = self._mgr._clock.time()
+        rate = self.messageRate
+        assert rate is not None
+        recovery = self._lastFloodWarning + self._mgr.floodWarningCooldown
+        if rate < self._mgr.maxMessageRate and now > recovery:
+            # additive increase for the time spent past the cooldown
+            rate += self._mgr.messageRateRecovery * (now - max(self._tokensTime, recovery))
+            self.messageRate = rate = min(rate, self._mgr.maxMessageRate)
+        self._tokens = min(self._tokens + (now - self._tokensTime) * rate,
+                           float(self._mgr.messageBurst))
+        self._tokensTime = now
+
+    def _schedulePace(self):
+        if self._paceTask is None and self._paced and self.messageRate:
+            self._paceTask = self._mgr.setTimeout((1 - self._tokens) / self.messageRate,
+                                                  self._pace)
+
+    def _pace(self):
+        """Send the paced messages the tokens allow for"""
+        self._paceTask = None
+        if self.messageRate is None:
+            # pacing got disabled in the meantime
+            self._tokens = float(len(self._paced))
+        else:
+            self._refill()
+        while self._paced and self._tokens >= 1:
+            self._tokens -= 1
+            msg, data = self._paced.popleft()
+            self._pacedSize -= self._chatSize(msg, data)
+            self._sendChat(msg, data)
+        self._schedulePace()
+
+    def _floodWarning(self, rate: float):
+        """Lower messageRate down to rate and empty the bucket"""
+        self._refill()
+        self.messageRate = max(min(self.messageRate or rate, rate), self._mgr.minMessageRate)
+        self._tokens = 0.0
+        self._lastFloodWarning = self._tokensTime
+        # the pending pace task was scheduled for the old rate
+        if self._paceTask is not None:
+            self._paceTask.cancel()
+            self._paceTask = None
+        self._schedulePace()
 
     def getLevel(self, user: User):
         """get the level of user in a room"""
@@ -1774,6 +2968,91 @@ class Room:
                 msg.detach()
 
 
+################################################################
+# Bulk join
+################################################################
+class JoinResult(typing.NamedTuple):
+    """Outcome of RoomManager.joinRooms"""
+    ready: list[str]
+    failed: list[str]
+    # seconds from the joinRooms call till every room was ready or failed
+    elapsed: float
+
+
+class _JoinBatch:
+    """Rooms of a joinRooms call, connected at most maxInFlight at a time"""
+    def __init__(self, mgr: RoomManager, names: typing.Iterable[str], maxInFlight: int):
+        self.mgr = mgr
+        self.pending = collections.deque(name.lower() for name in names)
+        self.maxInFlight = max(1, maxInFlight)
+        self.inFlight = 0
+        self.ready: list[str] = []
+        self.failed: list[str] = []
+        self.start = mgr._clock.time()
+        self.lastConnect = 0.0
+        self.task: Task | None = None
+        # per room in flight, failing it after the manager joinTimeout
+        self.deadlines: dict[Room, Task] = dict()
+        self.future: concurrent.futures.Future[JoinResult] = concurrent.futures.Future()
+
+    def next(self):
+        """Connect the next rooms, spaced by the manager joinInterval"""
+        self.task = None
+        while self.pending and self.inFlight < self.maxInFlight:
+            wait = self.lastConnect + self.mgr.joinInterval - self.mgr._clock.time()
+            if wait > 0:
+                self.task = self.mgr.setTimeout(wait, self.next)
+                return
+            name = self.pending.popleft()
+            room = self.mgr.getRoom(name)
+            if room is not None and room._connectAmount:
+                # already joined and ready
+                self.ready.append(name)
+                continue
+            if room is None:
+                self.lastConnect = self.mgr._clock.time()
+                room = self.mgr.joinRoom(name)
+            self.inFlight += 1
+            self.mgr._joining.setdefault(room, []).append(self)
+            if self.mgr.joinTimeout is not None:
+                self.deadlines[room] = self.mgr.setTimeout(self.mgr.joinTimeout,
+                                                           self.expire, room)
+        self.check()
+
+    def expire(self, room: Room):
+        """The room isn't ready within joinTimeout, most likely retrying, stop waiting on it"""
+        del self.deadlines[room]
+        batches = self.mgr._joining.get(room, [])
+        if self in batches:
+            batches.remove(self)
+            if not batches:
+                del self.mgr._joining[room]
+            self.done(room, False)
+
+    def done(self, room: Room, ready: bool):
+        if (deadline := self.deadlines.pop(room, None)) is not None:
+            deadline.cancel()
+        self.inFlight -= 1
+        (self.ready if ready else self.failed).append(room.name)
+        if self.task is None:
+            self.next()
+
+    def cancel(self):
+        """Fail the rooms not connected yet"""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        self.failed.extend(self.pending)
+        self.pending.clear()
+        self.check()
+
+    def check(self):
+        if not self.pending and not self.inFlight and not self.future.done():
+            self.mgr._joinBatches.discard(self)
+            self.future.set_result(JoinResult(self.ready, self.failed,
+                                              self.mgr._clock.time() - self.start))
+
+
 ################################################################
 # RoomManager class
 ################################################################
@@ -1784,11 +3063,70 @@ class RoomManager:
     ####
     _Room = Room
     _PM = PM
+    _Scheduler = Scheduler
     # socket select wait/sleep time in seconds before next task tick
     _TimerResolution = 0.2
-    _deferredThreads: set[threading.Thread] = set()
+    # max amount of deferToThread functions running at once, the rest are queued
+    maxDeferredThreads = 8
+    # max bytes and frames read from one conn per wakeup before moving
+    # on to the other conns, the rest is read on the next loop iteration
+    readBudget = 2**18
+    readFrameBudget = 1000
+    # size of the receive scratch buffer shared by the conns of the manager
+    recvBufferSize = 2**16
+    # max size of a frame being received, what to do with a bigger one
+    maxFrameSize = 2**20
+    oversizedFrame = OversizedFrame_Mode.Drop
+    # received commands to skip without processing them, eg: {"n", "participant"},
+    # they don't go through onRaw either
+    ignoreCommands: frozenset[str] = frozenset()
+    # bytes queued for sending past which a conn is under backpressure,
+    # chat messages are then merged or dropped, control and moderation are still sent
+    writeHighWater = 2**18
+    chatBackpressure = Backpressure_Mode.Merge
+    # handshakes kept outstanding by joinRooms and seconds between two of its connects,
+    # a room not ready within joinTimeout (reconnects included) is reported as failed
+    # and keeps reconnecting on its own, None to wait for it
+    maxJoinsInFlight = 10
+    joinInterval = 0.05
+    joinTimeout: float | None = 30.0
+    # reconnect the rooms that lost their connection, after reconnectDelay seconds
+    # doubled on every failed attempt up to reconnectMaxDelay, minus up to
+    # reconnectJitter of it at random. At most maxReconnectsInFlight rooms, and
+    # maxReconnectsPerHost per chat server, are reconnecting at once
+    autoReconnect = True
+    reconnectDelay = 1.0
+    reconnectMaxDelay = 300.0
+    reconnectJitter = 0.5
+    maxReconnectsInFlight = 10
+    maxReconnectsPerHost = 2
+    # seconds to keep the resolved address of a server, 0 to resolve on every connect
+    dnsCacheTTL = 300
+    # lookups running at once, in their own pool so deferToThread jobs can't hold them up
+    maxResolverThreads = 4
+    # chat messages per second and burst allowed per room, the rest is queued,
+    # None to send them right away. A flood warning halves the rate (a flood ban sets it
+    # to minMessageRate), it then increases by messageRateRecovery every second
+    # once floodWarningCooldown seconds passed since the last warning
+    maxMessageRate: float | None = 1.0
+    minMessageRate = 0.2
+    messageBurst = 4
+    messageRateRecovery = 0.01
+    floodWarningCooldown = 60
     disconnectOnEmptyConnAndTask = True
     pingDelay = 90
+    # the conns are pinged in that many groups spread over pingDelay
+    pingSweepSlices = 30
+    # seconds without receiving anything after which a conn is considered dead
+    # and reconnected, checked when pinging, None to disable
+    idleTimeout: float | None = 300
+    # weight of the last ping round trip in the smoothed pingRtt
+    pingRttAlpha = 0.2
+    # seconds a task or event handler can run before it gets logged as slow, None to disable
+    slowTaskWarning: float | None = 0.5
+    # seconds a main loop iteration can take before a watchdog thread logs the stack
+    # of the main loop thread, None to not run the watchdog
+    watchdogTimeout: float | None = None
     userlistMode = Userlist_Mode.Recent
     userlistUnique = True
     userlistMemory = 50
@@ -1801,11 +3139,78 @@ class RoomManager:
     # Init
     ####
     def __init__(self, name: Optional[str] = None, password: Optional[str] = None,
-                 pm: bool = True):
+                 pm: bool = True, clock: Optional[Clock] = None):
         self._name = name
         self._password = password
+        self._user = User("@self") if name is None else User(name)
         self._running = False
+        # time source of the tasks, timeouts and main loop waits, see VirtualClock
+        self._clock = Clock() if clock is None else clock
+        self._scheduler = self._Scheduler(self)
         self._rooms: dict[str, Room] = dict()
+        self._pm: PM | None = None
+        # live registry of the connected sockets and the sockets with pending
+        # write, kept up to date by the conns instead of rebuilt every loop
+        self._conns: dict[socket.socket, Conn] = dict()
+        self._wsocks: set[socket.socket] = set()
+        # epoll/kqueue/... where available, every conn is registered once and
+        # only has its write interest toggled when its pendingWrite changes
+        self._selector = selectors.DefaultSelector()
+        # only one conn reads at a time, so they can all share the scratch space,
+        # as a memoryview so slicing it doesn't make a copy
+        self._sbuf = memoryview(bytearray(self.recvBufferSize))
+        self._ignoredCommands = frozenset(cmd.encode() for cmd in self.ignoreCommands)
+        # received frames by command
+        self._processedFrames: collections.Counter[bytes] = collections.Counter()
+        self._skippedFrames: collections.Counter[bytes] = collections.Counter()
+        # callbacks queued by other threads, see callFromThread
+        self._threadCalls: collections.deque[tuple[Callable[..., None], Any, Any]] = \
+            collections.deque()
+        self._waker = _Waker(self)
+        self._selector.register(self._waker.sock, selectors.EVENT_READ, self._waker)
+        # deferToThread pool, created on first use
+        self._executor: concurrent.futures.ThreadPoolExecutor | None = None
+        self._deferredLock = threading.Lock()
+        # deferred calls whose callback is yet to be run by the main loop
+        self._deferredPending = 0
+        self._deferredQueued = 0
+        self._deferredActive = 0
+        # thread running the main loop, the timers of this manager run there
+        self._loopThread: threading.Thread | None = None
+        # one task pinging a slice of the conns at a time instead of one task per conn
+        self._pingSlices: list[set[Conn]] = [set() for _ in range(max(1, self.pingSweepSlices))]
+        self._pingSlots: dict[Conn, int] = dict()
+        self._pingCounter = itertools.count()
+        self._pingSlice = 0
+        self._pingTask: Task | None = None
+        # joinRooms in progress and the rooms they are waiting on
+        self._joinBatches: set[_JoinBatch] = set()
+        self._joining: dict[Room, list[_JoinBatch]] = dict()
+        # rooms waiting to be reconnected by name, the ones due waiting for a free slot,
+        # the reconnecting ones with their server and how many per server
+        self._reconnectWaiting: dict[str, Room] = dict()
+        self._reconnectQueue: collections.deque[Room] = collections.deque()
+        self._reconnectsInFlight: dict[Room, str] = dict()
+        self._reconnectHosts: collections.Counter[str] = collections.Counter()
+        # {(host, port): (address, expiry)} and the callbacks waiting on a lookup
+        self._dnsCache: dict[tuple[str, int], tuple[tuple[Any, ...], float]] = dict()
+        self._dnsWaiting: dict[tuple[str, int],
+                               list[Callable[[tuple[Any, ...] | None], None]]] = dict()
+        # resolver pool, created on first use
+        self._resolver: concurrent.futures.ThreadPoolExecutor | None = None
+        self._dnsHits = 0
+        self._dnsMisses = 0
+        self._dnsResolves = 0
+        self._dnsFailures = 0
+        self._dnsResolveTime = 0.0
+        self._dnsMaxResolveTime = 0.0
+        # {task function or event name: [calls, total time, max time]}
+        self._runStats: dict[str, list[Any]] = dict()
+        # monotonic time the current main loop iteration started at, None while waiting
+        self._busySince: float | None = None
+        self._watchdogThread: threading.Thread | None = None
+        # spans of the main loop are recorded while set, see enableTracing
+        self._tracer: Tracer | None = None
         if self._password and pm:
             self._pm = self._PM(mgr=self)
         else:
@@ -1821,10 +3226,27 @@ class RoomManager:
         @param room: room to join
         """
         room = room.lower()
-        if (con := self._rooms.get(room)) is None:
+        if (con := self._rooms.get(room) or self._reconnectWaiting.get(room)) is None:
             con = self._Room(room, uid, mgr=self)
         return con
 
+    def joinRooms(self, rooms: typing.Iterable[str],
+                  maxInFlight: Optional[int] = None) -> concurrent.futures.Future[JoinResult]:
+        """
+        Join many rooms, keeping at most maxInFlight handshakes outstanding
+        and spacing the connects by joinInterval.
+
+        @param rooms: rooms to join
+        @param maxInFlight: max rooms connecting at once, default to maxJoinsInFlight
+
+        @return: future of the JoinResult, done once every room is ready
+            (inited) or failed
+        """
+        batch = _JoinBatch(self, rooms, maxInFlight or self.maxJoinsInFlight)
+        self._joinBatches.add(batch)
+        batch.next()
+        return batch.future
+
     def leaveRoom(self, room: str):
         """
         Leave a room.
@@ -1834,6 +3256,8 @@ class RoomManager:
         room = room.lower()
         if con := self._rooms.get(room):
             con.disconnect()
+        elif con := self._reconnectWaiting.get(room):
+            con._cancelReconnect()
 
     def getRoom(self, room: str) -> Room | None:
         """
@@ -1848,12 +3272,17 @@ class RoomManager:
     ####
     # Properties
     ####
-    def _getUser(self): return User("@self") if self._name is None else User(self._name)
+    def _getUser(self): return self._user
     def _getName(self): return self._name
     def _getPassword(self): return self._password
     def _getRooms(self): return set(self._rooms.values())
     def _getRoomNames(self): return set(self._rooms.keys())
     def _getPM(self): return self._pm
+    def _getDeferredQueueDepth(self): return self._deferredQueued
+    def _getDeferredActive(self): return self._deferredActive
+    def _getScheduler(self): return self._scheduler
+    def _getClock(self): return self._clock
+    def _getTracer(self): return self._tracer
 
     user = property(_getUser)
     name = property(_getName)
@@ -1861,6 +3290,11 @@ class RoomManager:
     rooms = property(_getRooms)
     roomnames = property(_getRoomNames)
     pm = property(_getPM)
+    deferredQueueDepth = property(_getDeferredQueueDepth)
+    deferredActive = property(_getDeferredActive)
+    scheduler = property(_getScheduler)
+    clock = property(_getClock)
+    tracer = property(_getTracer)
 
     ####
     # Virtual methods
@@ -1877,8 +3311,26 @@ class RoomManager:
             except UnicodeEncodeError as ex:
                 text = (text[0:ex.start]+'(unicode)'+text[ex.end:])
 
+    def _wantsRaw(self) -> bool:
+        # every frame has to be decoded when onRaw or onEventCalled is overridden
+        return debug or type(self).onRaw is not RoomManager.onRaw or \
+            getattr(self.onEventCalled, "__func__", None) is not RoomManager.onEventCalled
+
+    def getFrameStats(self) -> dict[str, tuple[int, int]]:
+        """
+        Get the amount of received frames by command
+
+        @return: dict of {command: (processed, skipped)}
+        """
+        return {cmd.decode(errors='replace'): (self._processedFrames[cmd], self._skippedFrames[cmd])
+                for cmd in self._processedFrames.keys() | self._skippedFrames.keys()}
+
     def _callEvent(self, conn: Conn, evt: str, *args: ..., **kw: ...):
+        start = time.perf_counter()
         getattr(self, evt)(conn, *args, **kw)
+        self._ran(evt, time.perf_counter() - start, conn)
+        if self._tracer is not None:
+            self._tracer.add(evt, "handler", start, conn)
         self.onEventCalled(conn, evt, *args, **kw)
 
     def onConnect(self, room: Room):
@@ -2175,23 +3627,71 @@ class RoomManager:
     ####
     # Deferring
     ####
-    def deferToThread(self, cb: Callable[..., None], func: Callable[..., None],
-                      *args: ..., **kw: ...):
+    def deferToThread(self, cb: Callable[..., None], func: Callable[..., Any],
+                      *args: ..., **kw: ...) -> concurrent.futures.Future[Any]:
         """
-        Defer a function to a thread and callback the return value.
+        Defer a function to a pooled thread and callback the return value
+        from within the main loop.
+
+        At most `maxDeferredThreads` functions run at once, the rest are queued.
 
-        @param callback: function to call on completion
-        @param cbargs: arguments to get supplied to the callback
+        @param cb: function to call with the return value on completion
         @param func: function to call
+
+        @return: future of the return value
         """
-        def f(func: Callable[..., None], cb: Callable[..., None], *args: ..., **kw: ...):
-            ret = func(*args, **kw)
-            self.setTimeout(0, cb, ret)
-            self._deferredThreads.remove(threading.current_thread())
+        def f():
+            with self._deferredLock:
+                self._deferredQueued -= 1
+                self._deferredActive += 1
+            try:
+                return func(*args, **kw)
+            finally:
+                with self._deferredLock:
+                    self._deferredActive -= 1
+
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                self.maxDeferredThreads, thread_name_prefix="ch-deferToThread")
+
+        with self._deferredLock:
+            self._deferredPending += 1
+            self._deferredQueued += 1
+        future = self._executor.submit(f)
+        future.add_done_callback(lambda fut: self.callFromThread(self._deferredDone, cb, fut))
+        return future
+
+    def _deferredDone(self, cb: Callable[..., None], future: concurrent.futures.Future[Any]):
+        # done from within the main loop so the loop never sees the deferred
+        # call as finished before the callback is run
+        with self._deferredLock:
+            self._deferredPending -= 1
+            if future.cancelled():
+                # never got to run, so it is still counted as queued
+                self._deferredQueued -= 1
+        if future.cancelled():
+            return
+        if (error := future.exception()) is not None:
+            print("[RoomManager][deferToThread] Exception in deferred function")
+            traceback.print_exception(error)
+            return
+        cb(future.result())
 
-        t = threading.Thread(target=f, args=(func, cb, *args), kwargs=kw)
-        self._deferredThreads.add(t)
-        t.start()
+    def callFromThread(self, func: Callable[..., None], *args: ..., **kw: ...):
+        """
+        Call a function from within the main loop as soon as possible,
+        safe to be called from any thread.
+
+        @param func: function to call
+        """
+        self._threadCalls.append((func, args, kw))
+        self._waker.wake()
+
+    def _runThreadCalls(self):
+        # only run what is queued now, calls queued while running wake the loop again
+        for _ in range(len(self._threadCalls)):
+            func, args, kw = self._threadCalls.popleft()
+            func(*args, **kw)
 
     ####
     # Scheduling
@@ -2218,14 +3718,15 @@ class RoomManager:
         # def dumbfunc(self):
         #    self.setTimeout(0, self.dumbfunc)
 
-        if timeout == 0 and Task.running_task is not None and Task.running_task.func == func:
+        running = self._scheduler.running_task
+        if timeout == 0 and running is not None and running.func == func:
             print('[task][warning] `timeout == 0` will result in high cpu usage with '
                   '"interval usage", use -1 timeout if intended to run once per tick, '
                   'or a reasonable amount of timeout like 0.2 (5 times per second)')
             print('[task][note] An error will be raised to avoid this message being printed '
                   'multiple times, consider using setInterval instead of a setTimeout within '
                   'a setTimeout if timeout 0 is required, and canceling it via '
-                  'ch.Task.running_task.cancel() from within the task itself')
+                  'mgr.scheduler.running_task.cancel() from within the task itself')
             raise RuntimeError('Preemptively exiting to prevent possible log flood causing '
                                'disk space exhaustion')
 
@@ -2276,59 +3777,345 @@ class RoomManager:
     ####
     # Util
     ####
+    def _ran(self, name: str, elapsed: float, conn: Optional[Conn] = None):
+        """Account the runtime of a task function or event handler, log it if too slow"""
+        if (stats := self._runStats.get(name)) is None:
+            stats = self._runStats[name] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += elapsed
+        if elapsed > stats[2]:
+            stats[2] = elapsed
+        if self.slowTaskWarning is not None and elapsed > self.slowTaskWarning:
+            room = getattr(conn, "name", None)
+            _log.warning("[RoomManager][slowTask] %s took %.3fs", name, elapsed,
+                         extra={"kind": "slowTask", "task": name, "elapsed": elapsed,
+                                "room": room})
+
+    def _joinDone(self, room: Room, ready: bool):
+        """Report the end of the handshake of a room to the joinRooms waiting on it"""
+        for batch in self._joining.pop(room, ()):
+            batch.done(room, ready)
+
+    def _reconnectBackoff(self, attempts: int) -> float:
+        """Seconds before the next reconnect of a conn that failed attempts times"""
+        delay = min(self.reconnectMaxDelay, self.reconnectDelay * 2 ** min(attempts, 16))
+        return delay * (1 - self.reconnectJitter * random.random())
+
+    def _queueReconnect(self, room: Room):
+        room._reconnectTask = None
+        self._reconnectQueue.append(room)
+        self._startReconnects()
+
+    def _startReconnects(self):
+        """Reconnect the due rooms within maxReconnectsInFlight and maxReconnectsPerHost"""
+        for room in list(self._reconnectQueue):
+            if len(self._reconnectsInFlight) >= self.maxReconnectsInFlight:
+                break
+            if self._reconnectHosts[room._server] >= self.maxReconnectsPerHost:
+                continue
+            self._reconnectQueue.remove(room)
+            del self._reconnectWaiting[room.name]
+            self._reconnectsInFlight[room] = room._server
+            self._reconnectHosts[room._server] += 1
+            room.reconnect()
+
+    def _reconnectDone(self, room: Room):
+        """Free the reconnect slot of a room once inited or disconnected"""
+        if (host := self._reconnectsInFlight.pop(room, None)) is not None:
+            self._reconnectHosts[host] -= 1
+            if self._reconnectQueue:
+                self._startReconnects()
+
+    def _resolve(self, host: str, port: int,
+                 cb: Callable[[tuple[Any, ...] | None], None]):
+        """
+        Resolve host off the main loop, or right away if cached within dnsCacheTTL,
+        concurrent lookups of the same host are done once
+
+        @param cb: function to call with the address, None if it failed to resolve
+        """
+        key = (host, port)
+        if (cached := self._dnsCache.get(key)) is not None and cached[1] > self._clock.time():
+            self._dnsHits += 1
+            cb(cached[0])
+            return
+        self._dnsMisses += 1
+        if (waiting := self._dnsWaiting.get(key)) is not None:
+            waiting.append(cb)
+            return
+        self._dnsWaiting[key] = [cb]
+        if self._resolver is None:
+            self._resolver = concurrent.futures.ThreadPoolExecutor(
+                self.maxResolverThreads, thread_name_prefix="ch-resolver")
+        # counted like a deferToThread call, so the main loop waits for it
+        with self._deferredLock:
+            self._deferredPending += 1
+        future = self._resolver.submit(_getAddr, host, port)
+        future.add_done_callback(lambda fut: self.callFromThread(self._resolveDone, key, fut))
+
+    def _resolveDone(self, key: tuple[str, int],
+                     future: concurrent.futures.Future[tuple[tuple[Any, ...] | Exception,
+                                                             float]]):
+        with self._deferredLock:
+            self._deferredPending -= 1
+        if future.cancelled():
+            # by stop, which already failed the waiting conns
+            return
+        addr, elapsed = future.result()
+        self._dnsResolves += 1
+        self._dnsResolveTime += elapsed
+        self._dnsMaxResolveTime = max(self._dnsMaxResolveTime, elapsed)
+        if isinstance(addr, Exception):
+            print("[RoomManager][_resolve] Failed to resolve", key[0], addr)
+            self._dnsFailures += 1
+            resolved = None
+        else:
+            resolved = addr
+            if self.dnsCacheTTL:
+                self._dnsCache[key] = (addr, self._clock.time() + self.dnsCacheTTL)
+        for cb in self._dnsWaiting.pop(key, ()):
+            cb(resolved)
+
+    def _resetPrefix(self):
+        """Render the message tags of every room again on their next message"""
+        for room in self._rooms.values():
+            room._prefix = None
+
+    def _splitMessage(self, msg: str, html: bool) -> list[str]:
+        """Escape msg and split it per maxLength according to tooBigMessage"""
+        msg = msg.rstrip()
+        if not html:
+            msg = msg.replace("<", "&lt;").replace(">", "&gt;")
+
+        if len(msg) <= self.maxLength:
+            return [msg]
+        if self.tooBigMessage == BigMessage_Mode.Cut:
+            return [msg[:self.maxLength].rstrip()]
+        return [msg[index:index+self.maxLength].rstrip()
+                for index in range(0, len(msg), self.maxLength)]
+
     def addConnection(self, room: Room):
+        # registered with the selector by the room once its socket is connecting
         self._rooms[room.name] = room
 
     def removeConnection(self, room: Room):
-        del self._rooms[room.name]
+        if self._rooms.get(room.name) is room:
+            del self._rooms[room.name]
+        self._unregister(room)
 
     def addPMConnection(self, pm: PM):
+        if self._pm is not None and self._pm is not pm:
+            self._unregister(self._pm)
         self._pm = pm
 
     def removePMConnection(self):
+        if self._pm is not None:
+            self._unregister(self._pm)
         self._pm = None
 
-    def getConnections(self):
-        li: dict[socket.socket, Conn] = dict((x.sock, x) for x in self._rooms.values())
-        if self._pm:
-            li[self.pm.sock] = self._pm
-        return li
+    def _register(self, conn: Conn):
+        events = selectors.EVENT_READ
+        self._conns[conn.sock] = conn
+        if conn.pendingWrite:
+            events |= selectors.EVENT_WRITE
+            self._wsocks.add(conn.sock)
+        self._selector.register(conn.sock, events, conn)
+
+        # spread the conns over the ping sweep slices
+        slot = next(self._pingCounter) % len(self._pingSlices)
+        self._pingSlots[conn] = slot
+        self._pingSlices[slot].add(conn)
+        if self._pingTask is None:
+            self._pingTask = self.setInterval(self.pingDelay / len(self._pingSlices),
+                                              self._pingSweep)
+
+    def _unregister(self, conn: Conn):
+        self._conns.pop(conn.sock, None)
+        self._wsocks.discard(conn.sock)
+        try:
+            self._selector.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+
+        if (slot := self._pingSlots.pop(conn, None)) is not None:
+            self._pingSlices[slot].discard(conn)
+        if not self._pingSlots and self._pingTask is not None:
+            # so the main loop can stop without any conn
+            self._pingTask.cancel()
+            self._pingTask = None
+
+    def _pingSweep(self):
+        """
+        Ping the conns of the next slice, so every conn is visited once per pingDelay,
+        unless they sent something within the last half of it (or are idle, see idleTimeout)
+        """
+        slot = self._pingSlice = (self._pingSlice + 1) % len(self._pingSlices)
+        recent = self._clock.time() - self.pingDelay / 2
+        for conn in list(self._pingSlices[slot]):
+            if conn.connected and (conn.lastSent <= recent or conn.idle):
+                conn.ping()
+
+    def _setWriteInterest(self, conn: Conn, write: bool):
+        """
+        Toggle the write interest of a conn, called by the conn when
+        its pendingWrite changes
+
+        @param conn: the Room or PM
+        @param write: whether the conn has data pending to be written
+        """
+        # not registered (yet), either still authenticating before
+        # the socket is created or already disconnected
+        if self._conns.get(getattr(conn, "sock", None)) is not conn:  # type: ignore
+            return
+
+        events = selectors.EVENT_READ
+        if write:
+            events |= selectors.EVENT_WRITE
+            self._wsocks.add(conn.sock)
+        else:
+            self._wsocks.discard(conn.sock)
+        self._selector.modify(conn.sock, events, conn)
+
+    def enableTracing(self, tracer: Optional[Tracer] = None) -> Tracer:
+        """
+        Record the spans of the main loop: select wait, rfeed/wfeed, _rcmd_*,
+        on* handlers, task ticks and tasks
+
+        @param tracer: tracer to record to, a new one by default
+
+        @return: the tracer, see Tracer.dump and Tracer.dumpOnSignal
+        """
+        self._tracer = Tracer() if tracer is None else tracer
+        return self._tracer
+
+    def disableTracing(self) -> Tracer | None:
+        """
+        Stop recording spans
+
+        @return: the tracer that was recording, if any
+        """
+        tracer, self._tracer = self._tracer, None
+        return tracer
+
+    def getSlowestTasks(self, count: int = 10) -> list[RunStats]:
+        """
+        Get the task functions and event handlers that took the longest to run
+
+        @param count: max amount of entries
+
+        @return: RunStats sorted by their longest run, slowest first
+        """
+        stats = [RunStats(name, *x) for name, x in self._runStats.items()]
+        stats.sort(key=lambda x: x.maxTime, reverse=True)
+        return stats[:count]
+
+    def getDNSStats(self) -> dict[str, float]:
+        """
+        Get the stats of the server name resolution
+
+        @return: dict of cache hits and misses, lookups done (and failed),
+            their average and max duration in seconds
+        """
+        return {
+            "hits": self._dnsHits,
+            "misses": self._dnsMisses,
+            "resolves": self._dnsResolves,
+            "failures": self._dnsFailures,
+            "avgResolveTime": self._dnsResolveTime / (self._dnsResolves or 1),
+            "maxResolveTime": self._dnsMaxResolveTime,
+        }
+
+    def getConnections(self) -> dict[socket.socket, Conn]:
+        """
+        Get a snapshot of the connected sockets
+
+        @return: dict of {socket: Room or PM}
+        """
+        return dict(self._conns)
 
     ####
     # Main
     ####
     def main(self):
+        self._loopThread = threading.current_thread()
         self.onInit()
         self._running = True
+        self._startWatchdog()
+        self._busySince = time.monotonic()
         while self._running:
-            time_to_next_task = Task.tick()
-
-            conns = self.getConnections()
-            wsocks = [sock for sock, x in conns.items() if x.pendingWrite]
-
-            if not conns:
-                if time_to_next_task is None:
-                    # Backward compatibilty in case of deferToThread joinRoom
-                    # or user managed threading
-
-                    # NOTE: Check for threading.active_count() instead?
-                    if not self._deferredThreads and self.disconnectOnEmptyConnAndTask:
-                        self.stop()
-                        break
-
-                    time.sleep(self._TimerResolution)
-                else:
-                    time.sleep(time_to_next_task)
-
+            time_to_next_task = self._scheduler.tick()
+
+            if not self._conns and time_to_next_task is None:
+                # Backward compatibilty in case of deferToThread joinRoom
+                # or user managed threading
+
+                # NOTE: Check for threading.active_count() instead?
+                if not self._deferredPending and not self._threadCalls \
+                        and self.disconnectOnEmptyConnAndTask:
+                    self.stop()
+                    break
+
+                time_to_next_task = self._TimerResolution
+
+            # the waker is always registered, so this also sleeps till the next
+            # task when there is no conn while still waking up for callFromThread
+            self._busySince = None
+            if (tracer := self._tracer) is not None:
+                start = time.perf_counter()
+            events = self._clock.select(self._selector, time_to_next_task)
+            if tracer is not None:
+                tracer.add("select", "loop", start)
+            self._busySince = time.monotonic()
+            self._dispatch(events)
+        self._busySince = None
+
+    def _startWatchdog(self):
+        if self.watchdogTimeout is None or \
+                (self._watchdogThread is not None and self._watchdogThread.is_alive()):
+            return
+        self._watchdogThread = threading.Thread(
+            target=self._watchdog, args=(threading.current_thread(),),
+            name="ch-watchdog", daemon=True)
+        self._watchdogThread.start()
+
+    def _watchdog(self, thread: threading.Thread):
+        """Log the stack of the main loop thread once per iteration taking too long"""
+        reported = None
+        while self._running and (timeout := self.watchdogTimeout) is not None:
+            time.sleep(timeout / 4)
+            since = self._busySince
+            if since is None or since == reported:
                 continue
-
-            rd, wr, _ = select.select(conns, wsocks, [], time_to_next_task)
-            for sock in rd:
-                con = conns[sock]
+            if (elapsed := time.monotonic() - since) > timeout:
+                reported = since
+                frame = sys._current_frames().get(thread.ident)  # type: ignore
+                stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+                task = self._scheduler.running_task
+                name = None if task is None else _funcName(task.func)
+                _log.warning("[RoomManager][watchdog] main loop busy for %.3fs, in task %s\n%s",
+                             elapsed, name, stack,
+                             extra={"kind": "stall", "task": name, "elapsed": elapsed,
+                                    "stack": stack})
+
+    def _dispatch(self, events: list[tuple[selectors.SelectorKey, int]]):
+        tracer = self._tracer
+        for key, mask in events:
+            con: Conn = key.data
+            if mask & selectors.EVENT_READ:
+                if tracer is not None:
+                    start = time.perf_counter()
                 con.rfeed()
-            for sock in wr:
-                con = conns[sock]
+                if tracer is not None:
+                    tracer.add("rfeed", "io", start, con)
+            # rfeed (of this or another conn) might have disconnected
+            # or reconnected the conn
+            if mask & selectors.EVENT_WRITE and con.connected and key.fileobj is con.sock \
+                    and con.pendingWrite:
+                if tracer is not None:
+                    start = time.perf_counter()
                 con.wfeed()
+                if tracer is not None:
+                    tracer.add("wfeed", "io", start, con)
 
     @classmethod
     def easy_start(cls, rooms: Optional[list[str]] = None,
@@ -2358,19 +4145,69 @@ class RoomManager:
 
         self = cls(name, password, pm=pm)
         if rooms:
-            for room in rooms:
-                self.joinRoom(room)
+            self.joinRooms(rooms)
 
         self.main()
 
     def stop(self):
+        for batch in list(self._joinBatches):
+            batch.cancel()
+        for room in list(self._reconnectWaiting.values()):
+            room._cancelReconnect()
         for conn in list(self._rooms.values()):
             conn.disconnect()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._resolver is not None:
+            self._resolver.shutdown(wait=False, cancel_futures=True)
+            self._resolver = None
+        # the lookups got cancelled or their result comes after a new one is needed
+        waiting, self._dnsWaiting = self._dnsWaiting, dict()
+        for cbs in waiting.values():
+            for cb in cbs:
+                cb(None)
         self._running = False
 
     ####
     # Commands
     ####
+    def broadcast(self, msg: str, rooms: Optional[typing.Iterable[Room | str]] = None,
+                  html: bool = False) -> int:
+        """
+        Send a message to many rooms.
+
+        The message is escaped, split, tagged and encoded once per distinct
+        name/font tags instead of once per room, the rooms then queue the same bytes.
+
+        @param msg: message
+        @param rooms: rooms or room names, default to every joined room
+        @param html: whether msg is html
+
+        @return: amount of rooms the message was queued to without dropping any of it
+        """
+        if rooms is None:
+            targets = list(self._rooms.values())
+        else:
+            targets = [x for x in (self.getRoom(r) if isinstance(r, str) else r for r in rooms)
+                       if x is not None]
+
+        chunks = self._splitMessage(msg, html)
+        encoded: dict[str, list[tuple[str, bytes]]] = dict()
+        count = 0
+        for room in targets:
+            prefix = room._messagePrefix()
+            if (payload := encoded.get(prefix)) is None:
+                payload = encoded[prefix] = []
+                for chunk in chunks:
+                    text = _formatMessage(prefix, chunk)
+                    payload.append((text, b"bmsg:tl2r:" + text.encode() + b"\r\n\x00"))
+            sent = True
+            for text, data in payload:
+                sent = room._rawMessage(text, data) and sent
+            count += sent
+        return count
+
     def enableBg(self):
         """Enable background if available."""
         self.user.mbg = True
@@ -2402,6 +4239,7 @@ class RoomManager:
         @param color3x: a 3-char RGB hex code for the color
         """
         self.user.nameColor = color3x
+        self._resetPrefix()
 
     def setFontColor(self, color3x: str):
         """
@@ -2410,6 +4248,7 @@ class RoomManager:
         @param color3x: a 3-char RGB hex code for the color
         """
         self.user.fontColor = color3x
+        self._resetPrefix()
 
     def setFontFace(self, face: str):
         """
@@ -2418,6 +4257,7 @@ class RoomManager:
         @param face: the font face
         """
         self.user.fontFace = face
+        self._resetPrefix()
 
     def setFontSize(self, size: int):
         """
@@ -2430,3 +4270,4 @@ class RoomManager:
         if size > 22:
             size = 22
         self.user.fontSize = str(size)
+        self._resetPrefix()
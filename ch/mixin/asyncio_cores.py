@@ -3,7 +3,7 @@
 import asyncio
 import contextlib
 import socket
-import time
+import threading
 from typing import Any, Awaitable, Callable
 
 # Importing ch for type hinting
@@ -12,27 +12,24 @@ from ch import RoomManager
 from ._base import Base
 
 
-class Asyncio_Task(ch.Task):
-    "class to override ch.Task"
-    _asyncio_task: Awaitable[Any] | None = None
-    __asyncio_wake = asyncio.Event()
+class Asyncio_Scheduler(ch.Scheduler):
+    "Scheduler ticked by an asyncio task instead of the main loop"
+    def __init__(self, mgr: RoomManager):
+        super().__init__(mgr)
+        self._asyncio_task: Awaitable[Any] | None = None
+        self.__asyncio_wake = asyncio.Event()
 
-    def __init__(self, mgr: RoomManager, timeout: int, func: Callable[..., None], isInterval: bool, args: ..., kw: ...):
-        super().__init__(mgr, timeout, func, isInterval, args, kw)
-        Asyncio_Task.__asyncio_wake.set()
-        if Asyncio_Task._asyncio_task is None:
-            Asyncio_Task._asyncio_task = asyncio.ensure_future(self._Tasks_Worker())
+    def _wake(self):
+        self.__asyncio_wake.set()
+        if self._asyncio_task is None:
+            self._asyncio_task = asyncio.ensure_future(self._Tasks_Worker())
 
     async def _Tasks_Worker(self):
         while (time_to_next_task := self.tick()) is not None:
-            Asyncio_Task.__asyncio_wake.clear()
+            self.__asyncio_wake.clear()
             with contextlib.suppress(asyncio.TimeoutError):
-                await asyncio.wait_for(Asyncio_Task.__asyncio_wake.wait(), time_to_next_task)
-        Asyncio_Task._asyncio_task = None
-
-
-print("[WARNING][asyncio_cores] Importing this module modify ch internals!")
-ch.Task = Asyncio_Task
+                await asyncio.wait_for(self.__asyncio_wake.wait(), time_to_next_task)
+        self._asyncio_task = None
 
 
 class _Asyncio_Core(ch.RoomManager):
@@ -44,42 +41,58 @@ class _Asyncio_Core(ch.RoomManager):
             li = [x._rfeed_worker_task for x in self._rooms.values()]
             if self._pm:
                 li.append(self._pm._rfeed_worker_task)
-            if Asyncio_Task._asyncio_task:
-                li.append(Asyncio_Task._asyncio_task)
+            if self._scheduler._asyncio_task:
+                li.append(self._scheduler._asyncio_task)
             return li
         loop = asyncio.get_event_loop()
+        self._asyncio_loop = loop
+        self._loopThread = threading.current_thread()
+        # run anything queued by callFromThread before the loop was known
+        self._runThreadCalls()
         self.onInit()
         self._running = True
         while self._running:
             ct = async_conn_and_task()
             if not ct:
-                if not self._deferredThreads and self.disconnectOnEmptyConnAndTask:
+                if not self._deferredPending and self.disconnectOnEmptyConnAndTask:
                     self.stop()
                     break
-                time.sleep(self._TimerResolution)
+                # still run the loop so callFromThread callbacks get processed
+                loop.run_until_complete(asyncio.sleep(self._TimerResolution))
 
             loop.run_until_complete(asyncio.gather(*ct))
 
+    def callFromThread(self, func: Callable[..., None], *args: Any, **kw: Any):
+        if (loop := getattr(self, "_asyncio_loop", None)) is None:
+            # not super(), this method get extracted into the mixin classes
+            RoomManager.callFromThread(self, func, *args, **kw)
+        else:
+            loop.call_soon_threadsafe(lambda: func(*args, **kw))
+
 class IOCPConn(Base):
     __wfeed_worker_task: Awaitable[Any] | None = None
 
     def __init__(self, room: str, uid: str | None, mgr: RoomManager):
+        # the reads of every conn are awaited concurrently,
+        # so they can't share the manager scratch buffer
+        self._sbuf = bytearray(2**14)
         self._async_connected = asyncio.Event()
         self._rfeed_worker_task = asyncio.ensure_future(self.async_rfeed())
         super().__init__(room, uid, mgr)
 
-    async def async_connect(self):
-        while True:
-            code = self.sock.connect_ex((self._server, self._port))
+    async def async_connect(self, sock: socket.socket, addr: tuple[Any, ...]):
+        while sock is self.sock:
+            code = sock.connect_ex(addr)
             if code == 0 or code == 106 or code == 10056:
                 # successful connect or connected already
                 self._async_connected.set()
                 break
             await asyncio.sleep(0)
 
-    def _connect(self):
-        super()._connect()
-        asyncio.ensure_future(self.async_connect())
+    def _resolved(self, sock: socket.socket, addr: tuple[Any, ...] | None):
+        super()._resolved(sock, addr)
+        if addr is not None and sock is self.sock and self.connected:
+            asyncio.ensure_future(self.async_connect(sock, addr))
 
     def _disconnect(self):
         self._async_connected.clear()
@@ -91,6 +104,7 @@ class IOCPConn(Base):
             try:
                 size = await asyncio.get_running_loop().sock_recv_into(self.sock, self._sbuf)
                 if size:
+                    self._received()
                     self._rbuf += self._sbuf[:size]
                     self.feed_tick()
                 else:
@@ -105,8 +119,8 @@ class IOCPConn(Base):
             await asyncio.sleep(0)
         self.__wfeed_worker_task = None
 
-    def _write(self, data: bytes):
-        super()._write(data)
+    def _queue(self, data: bytes, priority: ch.Send_Priority):
+        super()._queue(data, priority)
         if self.__wfeed_worker_task is None:
             self.__wfeed_worker_task = asyncio.ensure_future(self._wfeed_worker())
 
@@ -121,33 +135,48 @@ class Asyncio_IOCPCore(Base):
     class _PM(IOCPConn, ch.PM):
         ...
 
+    _Scheduler = Asyncio_Scheduler
     main = _Asyncio_Core.main
+    callFromThread = _Asyncio_Core.callFromThread
 
 
 class LWMConn(Base):
     def __init__(self, room: str, uid: str | None, mgr: RoomManager):
         self._rfeed_running = asyncio.Event()
         self._rfeed_worker_task = self._rfeed_running.wait()
+        # like the selector registration, no writer till the connect is started
+        self._lwm_registered = False
         super().__init__(room, uid, mgr)
-        asyncio.get_event_loop().add_reader(self.sock, self.rfeed)
 
     def _connect(self):
         self._rfeed_running.clear()
+        self._lwm_registered = False
         super()._connect()
 
+    def _resolved(self, sock: socket.socket, addr: tuple[Any, ...] | None):
+        super()._resolved(sock, addr)
+        # an unconnected socket would be reported readable right away
+        if addr is not None and sock is self.sock and self.connected:
+            self._lwm_registered = True
+            asyncio.get_event_loop().add_reader(sock, self.rfeed)
+            if self._wbuf:
+                asyncio.get_event_loop().add_writer(sock, self.wfeed)
+
     def _disconnect(self):
+        self._lwm_registered = False
         asyncio.get_event_loop().remove_reader(self.sock)
         self._rfeed_running.set()
         asyncio.get_event_loop().remove_writer(self.sock)
         super()._disconnect()
 
-    def _write(self, data: bytes):
-        super()._write(data)
-        asyncio.get_event_loop().add_writer(self.sock, self.wfeed)
+    def _queue(self, data: bytes, priority: ch.Send_Priority):
+        super()._queue(data, priority)
+        if self._lwm_registered:
+            asyncio.get_event_loop().add_writer(self.sock, self.wfeed)
 
     def wfeed(self):
         super().wfeed()
-        if not self._sbuf:
+        if not self._wbuf:
             asyncio.get_event_loop().remove_writer(self.sock)
 
 
@@ -161,4 +190,6 @@ class Asyncio_LWMCore(Base):
     class _PM(LWMConn, ch.PM):
         ...
 
+    _Scheduler = Asyncio_Scheduler
     main = _Asyncio_Core.main
+    callFromThread = _Asyncio_Core.callFromThread
@@ -2,6 +2,7 @@
 
 # pylint fail to properly detect member, false positive so disabled
 # pylint: disable=no-member
+import functools
 from typing import Optional
 
 # Importing ch for type hinting
@@ -92,6 +93,7 @@ class Secure(Base):
                 self.owner = ch.User(args[0])
                 self.uid = args[1]
                 self._mods = set(map(lambda x: ch.User(x.split(",")[0]), args[6].split(";")))
+                self._prefix = None
                 self._i_log.clear()
 
         class RoomSecure(_RoomSecure, cls._Room):
@@ -99,13 +101,8 @@ class Secure(Base):
 
         class _PMSecure(Base):
             def _auth(self):
-                auid = self._getAuth(name, password)  # type: ignore
-                if auid is None:
-                    self._callEvent("onLoginFail")
-                    return False
-                self._sendCommand("tlogin", auid, "2")
-                self._setWriteLock(True)
-                return True
+                self._mgr.deferToThread(functools.partial(self._authed, self.sock),
+                                        self._getAuth, name, password)  # type: ignore
 
         class PMSecure(_PMSecure, cls._PM):
             ...
@@ -114,19 +111,14 @@ class Secure(Base):
             _Room = RoomSecure
             _PM = PMSecure
 
-            def __init__(self, pm: bool = True):  # pylint: disable=super-init-not-called
-                self._name = name
-                self._password = "" # blank dummy so stuff doesn't break
-                self._running = False
-                self._rooms = dict()
+            def __init__(self, pm: bool = True):
+                # blank dummy password so stuff doesn't break
+                super().__init__(name, "", pm=False)
                 if password and pm:
                     self._pm = self._PM(mgr=self)
-                else:
-                    self._pm = None
 
         self = RoomManagerSecure(pm=pm)
         if rooms:
-            for room in rooms:
-                self.joinRoom(room)
+            self.joinRooms(rooms)
 
         self.main()
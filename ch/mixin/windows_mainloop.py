@@ -2,7 +2,7 @@
 
 # pylint fail to properly detect member, false positive so disabled
 # pylint: disable=no-member
-import select
+import threading
 import time
 
 # Importing ch for type hinting
@@ -19,47 +19,47 @@ class _WindowsMainLoopFix(ch.RoomManager):
     """
 
     def main(self):
+        self._loopThread = threading.current_thread()
         self.onInit()
         self._running = True
+        self._startWatchdog()
+        self._busySince = time.monotonic()
         while self._running:
-            time_to_next_task = ch.Task.tick()
+            time_to_next_task = self._scheduler.tick()
 
-            conns = self.getConnections()
-            wsocks = [sock for sock, x in conns.items() if x.pendingWrite]
+            if not self._conns and time_to_next_task is None:
+                # Backward compatibility in case of deferToThread joinRoom
+                # or user managed threading
 
-            if not conns:
-                if time_to_next_task is None:
-                    # Backward compatibility in case of deferToThread joinRoom
-                    # or user managed threading
-
-                    # NOTE: Check for threading.active_count() instead?
-                    if not self._deferredThreads and self.disconnectOnEmptyConnAndTask:
-                        self.stop()
-                        break
-
-                    time.sleep(self._TimerResolution)
-                else:
-                    time.sleep(time_to_next_task)
-
-                continue
+                # NOTE: Check for threading.active_count() instead?
+                if not self._deferredPending and not self._threadCalls \
+                        and self.disconnectOnEmptyConnAndTask:
+                    self.stop()
+                    break
 
             if time_to_next_task is None:
                 time_to_next_task = self._TimerResolution
 
-            next_target = ch.Task.get_next_tick_target()
+            next_target = self._scheduler.get_next_tick_target()
 
+            self._busySince = None
+            if (tracer := self._tracer) is not None:
+                start = time.perf_counter()
+            events = None
             for _ in range(int((time_to_next_task/0.2)+0.5)):
-                if not self._running or conns != self.getConnections() or next_target != ch.Task.get_next_tick_target():
+                # new conns are picked up by the selector on the next select,
+                # only a change in task target requires recalculating the wait
+                if not self._running or next_target != self._scheduler.get_next_tick_target():
                     break
-                rd, wr, _ = select.select(conns, wsocks, [], 0.2)
-                if rd or wr:
-                    for sock in rd:
-                        con = conns[sock]
-                        con.rfeed()
-                    for sock in wr:
-                        con = conns[sock]
-                        con.wfeed()
+                if events := self._clock.select(self._selector, 0.2):
                     break
+            if tracer is not None:
+                # the whole wait as one span, like the single select of the base main
+                tracer.add("select", "loop", start)
+            self._busySince = time.monotonic()
+            if events:
+                self._dispatch(events)
+        self._busySince = None
 
 
 class WindowsMainLoopFix(Base):
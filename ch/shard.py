@@ -0,0 +1,414 @@
+"""
+Spread the rooms of one bot identity over multiple RoomManager
+
+Each shard runs its own RoomManager (and main loop), either in a separate
+process (ShardSupervisor) or in a separate thread (ThreadedShards),
+rooms are assigned to a shard by hashing the room name.
+"""
+from __future__ import annotations
+import multiprocessing
+import multiprocessing.process
+import multiprocessing.queues
+import os
+import queue
+import threading
+import time
+import typing
+import zlib
+from typing import Any, Callable, Optional
+
+import ch
+
+
+class ShardMessage(typing.NamedTuple):
+    """Picklable copy of a ch.Message forwarded from a shard"""
+    user: str
+    body: str
+    time: float
+    msgid: str | None
+    ip: str
+    unid: str
+
+
+class ShardEvent(typing.NamedTuple):
+    shard: int
+    room: str
+    evt: str
+    args: tuple[Any, ...]
+
+
+def getShard(room: str, shards: int) -> int:
+    """
+    Get the shard of a room, stable across processes and restarts.
+
+    @param room: room name
+    @param shards: amount of shards
+
+    @return: shard index
+    """
+    return zlib.crc32(room.lower().encode()) % shards
+
+
+def _portable(arg: Any) -> Any:
+    """Convert event arguments into something that can be sent to the parent"""
+    if isinstance(arg, ch.User):
+        return arg.name
+    if isinstance(arg, ch.Message):
+        return ShardMessage(arg.user.name, arg.body, arg.time, arg.msgid, arg.ip, arg.unid)
+    if isinstance(arg, (ch.Room, ch.PM)):
+        return getattr(arg, "name", "")
+    if arg is None or isinstance(arg, (str, int, float, bool)):
+        return arg
+    return repr(arg)
+
+
+def _runCommand(mgr: ch.RoomManager, cmd: tuple[Any, ...]):
+    op, *args = cmd
+    if op == "join":
+        mgr.joinRoom(args[0])
+    elif op == "leave":
+        mgr.leaveRoom(args[0])
+    elif op == "message":
+        if room := mgr.getRoom(args[0]):
+            room.message(args[1], html=args[2])
+    elif op == "pm":
+        if mgr.pm:
+            mgr.pm.message(ch.User(args[0]), args[1])
+    elif op == "stop":
+        mgr.stop()
+
+
+def _readCommands(mgr: ch.RoomManager, commands: multiprocessing.queues.Queue[Any]):
+    while True:
+        cmd = commands.get()
+        mgr.callFromThread(_runCommand, mgr, cmd)
+        if cmd[0] == "stop":
+            break
+
+
+def _shardMain(mgrClass: type[ch.RoomManager], index: int, name: Optional[str],
+               password: Optional[str], pm: bool, rooms: list[str],
+               forward: Optional[frozenset[str]], commands: multiprocessing.queues.Queue[Any],
+               events: multiprocessing.queues.Queue[Any]):
+    """Entry point of a shard process"""
+    mgr = mgrClass(name, password, pm=pm)
+    # the shard is kept alive by the supervisor even without any room
+    mgr.disconnectOnEmptyConnAndTask = False
+
+    onEventCalled = mgr.onEventCalled
+
+    def forwardEvent(conn: ch.Conn, evt: str, *args: Any, **kw: Any):
+        onEventCalled(conn, evt, *args, **kw)
+        if forward is None or evt in forward:
+            room = getattr(conn, "name", "")
+            events.put(ShardEvent(index, room, evt, tuple(_portable(x) for x in args)))
+
+    mgr.onEventCalled = forwardEvent  # type: ignore
+
+    for room in rooms:
+        mgr.joinRoom(room)
+
+    threading.Thread(target=_readCommands, args=(mgr, commands), daemon=True).start()
+    mgr.main()
+
+
+class ShardSupervisor:
+    """
+    Run one bot identity over `shards` processes, each running its own mgrClass
+
+    mgrClass has to be importable by the child processes (defined at module level),
+    the event handlers defined on it run within the shard processes,
+    the events listed in `forward` are also sent to `onShardEvent` in the parent.
+
+    The PM connection, if any, is only made by shard 0.
+    """
+    ####
+    # Config
+    ####
+    # seconds to wait on the event queue before checking the shards health
+    _CheckInterval = 0.5
+    # minimum seconds between two restarts of the same shard
+    restartDelay = 5
+
+    def __init__(self, mgrClass: type[ch.RoomManager], shards: Optional[int] = None,
+                 name: Optional[str] = None, password: Optional[str] = None,
+                 pm: bool = True, forward: Optional[typing.Iterable[str]] = None):
+        """
+        @param mgrClass: RoomManager subclass to run in each shard
+        @param shards: amount of processes, default to the amount of cpu
+        @param name: name to join as
+        @param password: password to join with
+        @param pm: whether to connect to the PM (done by shard 0)
+        @param forward: events to forward to onShardEvent, None for all of them
+        """
+        self.mgrClass = mgrClass
+        self.shards = shards or os.cpu_count() or 1
+        self._name = name
+        self._password = password
+        self._pm = pm
+        self._forward = None if forward is None else frozenset(forward)
+        self._running = False
+        self._events: multiprocessing.queues.Queue[ShardEvent] = multiprocessing.Queue()
+        self._rooms: list[set[str]] = [set() for _ in range(self.shards)]
+        self._procs: list[multiprocessing.process.BaseProcess | None] = [None] * self.shards
+        self._commands: list[multiprocessing.queues.Queue[Any] | None] = [None] * self.shards
+        self._started: list[float] = [0.0] * self.shards
+        self.restarts: list[int] = [0] * self.shards
+
+    ####
+    # Join/leave
+    ####
+    def joinRoom(self, room: str):
+        """
+        Join a room on its shard.
+
+        @param room: room to join
+        """
+        room = room.lower()
+        shard = getShard(room, self.shards)
+        self._rooms[shard].add(room)
+        self._send(shard, ("join", room))
+
+    def leaveRoom(self, room: str):
+        """
+        Leave a room.
+
+        @param room: room to leave
+        """
+        room = room.lower()
+        shard = getShard(room, self.shards)
+        self._rooms[shard].discard(room)
+        self._send(shard, ("leave", room))
+
+    def getShard(self, room: str) -> int:
+        return getShard(room, self.shards)
+
+    ####
+    # Properties
+    ####
+    def _getRoomNames(self): return set().union(*self._rooms)
+
+    roomnames = property(_getRoomNames)
+
+    ####
+    # Commands
+    ####
+    def message(self, room: str, msg: str, html: bool = False):
+        """
+        Send a message to a room through its shard.
+
+        Messages to a shard that is being restarted are lost.
+
+        @param room: room name
+        @param msg: message
+        """
+        room = room.lower()
+        self._send(getShard(room, self.shards), ("message", room, msg, html))
+
+    def pmMessage(self, user: str, msg: str):
+        """send a pm to a user through shard 0"""
+        self._send(0, ("pm", user, msg))
+
+    ####
+    # Virtual methods
+    ####
+    def onShardEvent(self, shard: int, room: str, evt: str, *args: Any):
+        """
+        Called in the parent for every forwarded event.
+
+        @param shard: shard where the event occurred
+        @param room: room name where the event occurred, "" for the PM
+        @param evt: the event, like "onMessage"
+        @param args: event args, User as name and Message as ShardMessage
+        """
+
+    def onShardStart(self, shard: int):
+        """
+        Called when a shard process is started or restarted.
+
+        @param shard: the shard
+        """
+
+    def onShardCrash(self, shard: int, exitcode: int | None):
+        """
+        Called when a shard process exits while running, it gets restarted after.
+
+        @param shard: the shard
+        @param exitcode: process exit code
+        """
+
+    ####
+    # Util
+    ####
+    def _send(self, shard: int, cmd: tuple[Any, ...]):
+        if (commands := self._commands[shard]) is not None:
+            commands.put(cmd)
+
+    def _start(self, shard: int):
+        # a fresh queue, the old one might be broken if the shard died while reading
+        commands: multiprocessing.queues.Queue[Any] = multiprocessing.Queue()
+        proc = multiprocessing.Process(
+            target=_shardMain,
+            args=(self.mgrClass, shard, self._name, self._password, self._pm and shard == 0,
+                  sorted(self._rooms[shard]), self._forward, commands, self._events),
+            name=f"ch-shard-{shard}",
+            daemon=True
+        )
+        proc.start()
+        self._commands[shard] = commands
+        self._procs[shard] = proc
+        self._started[shard] = time.monotonic()
+        self.onShardStart(shard)
+
+    def _checkShards(self):
+        now = time.monotonic()
+        for shard, proc in enumerate(self._procs):
+            if proc is None or proc.is_alive():
+                continue
+            if self._commands[shard] is not None:
+                self._commands[shard] = None
+                self.onShardCrash(shard, proc.exitcode)
+            if now - self._started[shard] >= self.restartDelay:
+                self.restarts[shard] += 1
+                self._start(shard)
+
+    ####
+    # Main
+    ####
+    def main(self):
+        self._running = True
+        for shard in range(self.shards):
+            self._start(shard)
+        try:
+            while self._running:
+                try:
+                    event = self._events.get(timeout=self._CheckInterval)
+                    self.onShardEvent(event.shard, event.room, event.evt, *event.args)
+                except queue.Empty:
+                    pass
+                if self._running:
+                    self._checkShards()
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._running = False
+        for shard in range(self.shards):
+            self._send(shard, ("stop",))
+        for proc in self._procs:
+            if proc is not None:
+                proc.join(2)
+                if proc.is_alive():
+                    proc.terminate()
+
+
+class ThreadedShards:
+    """
+    Run one bot identity over `shards` loop threads within this process
+
+    Each shard is its own mgrClass instance owning a subset of the rooms,
+    its event handlers run in its own loop thread. Calls from outside of a
+    shard are handed over to its loop with callFromThread.
+
+    Only scales past one core on a free-threaded (no-GIL) build of CPython.
+    The PM connection, if any, is only made by shard 0.
+    """
+    def __init__(self, mgrClass: type[ch.RoomManager], shards: Optional[int] = None,
+                 name: Optional[str] = None, password: Optional[str] = None,
+                 pm: bool = True):
+        """
+        @param mgrClass: RoomManager subclass to run in each shard
+        @param shards: amount of loop threads, default to the amount of cpu
+        @param name: name to join as
+        @param password: password to join with
+        @param pm: whether to connect to the PM (done by shard 0)
+        """
+        self.shards = shards or os.cpu_count() or 1
+        self.managers = [mgrClass(name, password, pm=pm and shard == 0)
+                         for shard in range(self.shards)]
+        self._threads: list[threading.Thread] = []
+
+    ####
+    # Join/leave
+    ####
+    def getManager(self, room: str) -> ch.RoomManager:
+        """Get the manager owning a room"""
+        return self.managers[getShard(room, self.shards)]
+
+    def joinRoom(self, room: str):
+        """
+        Join a room on its shard.
+
+        @param room: room to join
+        """
+        mgr = self.getManager(room)
+        self._call(mgr, mgr.joinRoom, room)
+
+    def leaveRoom(self, room: str):
+        """
+        Leave a room.
+
+        @param room: room to leave
+        """
+        mgr = self.getManager(room)
+        self._call(mgr, mgr.leaveRoom, room)
+
+    def getRoom(self, room: str) -> ch.Room | None:
+        return self.getManager(room).getRoom(room)
+
+    ####
+    # Properties
+    ####
+    def _getRooms(self): return set().union(*(mgr.rooms for mgr in self.managers))
+
+    rooms = property(_getRooms)
+
+    ####
+    # Commands
+    ####
+    def message(self, room: str, msg: str, html: bool = False):
+        """
+        Send a message to a room from within its shard.
+
+        @param room: room name
+        @param msg: message
+        """
+        mgr = self.getManager(room)
+
+        def f():
+            if con := mgr.getRoom(room):
+                con.message(msg, html=html)
+        self._call(mgr, f)
+
+    ####
+    # Util
+    ####
+    def _call(self, mgr: ch.RoomManager, func: Callable[..., Any], *args: Any):
+        if mgr._loopThread in (None, threading.current_thread()):
+            func(*args)
+        else:
+            mgr.callFromThread(func, *args)
+
+    ####
+    # Main
+    ####
+    def main(self):
+        """Run every shard in its own thread and wait for all of them to stop"""
+        for shard, mgr in enumerate(self.managers):
+            # keep the shards alive, rooms can be joined later on
+            mgr.disconnectOnEmptyConnAndTask = False
+            thread = threading.Thread(target=mgr.main, name=f"ch-shard-{shard}", daemon=True)
+            # set before starting so calls made in the meantime get handed over
+            mgr._loopThread = thread
+            self._threads.append(thread)
+            thread.start()
+        try:
+            for thread in self._threads:
+                while thread.is_alive():
+                    thread.join(0.2)
+        finally:
+            self.stop()
+
+    def stop(self):
+        for mgr in self.managers:
+            self._call(mgr, mgr.stop)
@@ -0,0 +1,123 @@
+"""joinRooms against a loopback server"""
+import socket
+import threading
+import unittest
+
+import ch
+
+OK = b"ok:owner:12345678:N:x:1.2.3.4.5:1.2.3.4:mod1,0\r\n\x00inited\r\n\x00"
+
+
+class _Server:
+    """Accepts every room, closes right away the connection of the bad* ones"""
+    def __init__(self):
+        self.lsock = socket.socket()
+        self.lsock.bind(("127.0.0.1", 0))
+        self.lsock.listen(64)
+        self.port = self.lsock.getsockname()[1]
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while True:
+            try:
+                conn, _ = self.lsock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def handle(self, conn: socket.socket):
+        with conn:
+            try:
+                data = conn.recv(65536)
+                if data.startswith(b"bauth:") and not data[6:].startswith(b"bad"):
+                    conn.sendall(OK)
+                    while conn.recv(65536):
+                        pass
+            except OSError:
+                pass
+
+    def close(self):
+        self.lsock.close()
+
+
+class TestJoinRooms(unittest.TestCase):
+    def setUp(self):
+        self.server = _Server()
+        port = self.server.port
+
+        class Room(ch.Room):
+            def _connect(self):
+                self._server = "127.0.0.1"
+                self._port = port
+                super()._connect()
+
+        class Bot(ch.RoomManager):
+            _Room = Room
+            reconnectDelay = 0.05
+            reconnectMaxDelay = 0.1
+            joinInterval = 0.0
+            joinTimeout = 0.5
+
+        self.Bot = Bot
+
+    def tearDown(self):
+        self.server.close()
+
+    def run_bot(self, onInit, timeout: float = 5.0):
+        bot = self.Bot(pm=False)
+        bot.onInit = lambda: onInit(bot)  # type: ignore
+        # don't hang the test run if the bot never stops, the main loop would
+        # still wait for this task once stopped by the test
+        guard = bot.setTimeout(timeout, bot.stop)
+        stop = bot.stop
+
+        def stopped():
+            guard.cancel()
+            stop()
+        bot.stop = stopped  # type: ignore
+        bot.main()
+        return bot
+
+    def test_lost_rooms_dont_block_the_batch(self):
+        futures = []
+
+        def onInit(bot: ch.RoomManager):
+            future = bot.joinRooms(["bad1", "bad2", "good1", "good2"], maxInFlight=2)
+            future.add_done_callback(lambda _: bot.stop())
+            futures.append(future)
+
+        self.run_bot(onInit)
+        result = futures[0].result(0)
+        self.assertEqual(sorted(result.ready), ["good1", "good2"])
+        self.assertEqual(sorted(result.failed), ["bad1", "bad2"])
+        self.assertLess(result.elapsed, 2)
+
+    def test_stop_resolves_waiting_batch(self):
+        futures = []
+
+        def onInit(bot: ch.RoomManager):
+            bot.joinTimeout = None
+            futures.append(bot.joinRooms(["bad1", "good1"]))
+            bot.setTimeout(0.5, bot.stop)
+
+        self.run_bot(onInit)
+        result = futures[0].result(0)
+        self.assertEqual(result.ready, ["good1"])
+        self.assertEqual(result.failed, ["bad1"])
+
+    def test_leave_room_resolves_waiting_batch(self):
+        futures = []
+
+        def onInit(bot: ch.RoomManager):
+            bot.joinTimeout = None
+            future = bot.joinRooms(["bad1"])
+            future.add_done_callback(lambda _: bot.stop())
+            futures.append(future)
+            bot.setTimeout(0.3, bot.leaveRoom, "bad1")
+
+        self.run_bot(onInit)
+        self.assertEqual(futures[0].result(0).failed, ["bad1"])
+
+
+if __name__ == "__main__":
+    unittest.main()